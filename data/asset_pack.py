@@ -0,0 +1,161 @@
+"""
+A single pack file holding the graphics, sound effects and slides already
+decoded, built offline with build_pack (or 'mario_level_1.py --build-pack').
+
+Images are stored as raw pixels in the display's byte order and slides
+already scaled to the popup box, so they become surfaces over the mapped
+file with pg.image.frombuffer.  Sounds are stored as the mixer's raw
+samples.  The index records every source file's size, mtime and SHA-1; a
+pack whose sources' contents changed, or that was made for a different
+display or mixer format, is reported as stale.
+"""
+
+import hashlib
+import marshal
+import mmap
+import os
+import struct
+import pygame as pg
+
+MAGIC = b'MPAK'
+VERSION = 1
+HEADER = struct.Struct('<4sHI')
+
+IMAGE = 'image'
+SLIDE = 'slide'
+SOUND = 'sound'
+
+
+def pack_key(path):
+    """Paths are stored relative and with forward slashes"""
+    return os.path.normpath(path).replace(os.sep, '/')
+
+
+def file_digest(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source_file:
+        for chunk in iter(lambda: source_file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_record(path):
+    """(size, mtime, SHA-1) of a source file"""
+    stat = os.stat(path)
+    return (stat.st_size, int(stat.st_mtime), file_digest(path))
+
+
+def target(settings):
+    """Everything besides the sources that the pack's contents depend on:
+    the display and mixer formats, and the caller's settings"""
+    return (tuple(pg.display.get_surface().get_masks()), pg.mixer.get_init(),
+            settings)
+
+
+def build_pack(path, sources, loaders, settings=None):
+    """Writes a pack.  sources maps each file to its kind, loaders maps a
+    kind to the function that loads a file of that kind, and settings is
+    any marshal-able value those loaders depend on"""
+    index = {'target': target(settings), 'sources': {}, 'entries': {}}
+    blobs = []
+    offset = 0
+    for source in sorted(sources):
+        kind = sources[source]
+        asset = loaders[kind](source)
+        if kind == SOUND:
+            data = asset.get_raw()
+            entry = (kind, offset, len(data))
+        else:
+            data = pg.image.tostring(asset, 'BGRA')
+            entry = (kind, offset, len(data), asset.get_width(),
+                     asset.get_height(), asset.get_colorkey())
+        key = pack_key(source)
+        index['sources'][key] = source_record(source)
+        index['entries'][key] = entry
+        blobs.append(data)
+        offset += len(data)
+
+    info = marshal.dumps(index)
+    directory = os.path.dirname(path)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path + '.tmp', 'wb') as pack_file:
+        pack_file.write(HEADER.pack(MAGIC, VERSION, len(info)))
+        pack_file.write(info)
+        for data in blobs:
+            pack_file.write(data)
+    os.replace(path + '.tmp', path)
+    return offset
+
+
+def open_pack(path):
+    """Maps a pack file, or returns None if it is missing or unreadable"""
+    try:
+        with open(path, 'rb') as pack_file:
+            mapped = mmap.mmap(pack_file.fileno(), 0, access=mmap.ACCESS_COPY)
+        magic, version, length = HEADER.unpack_from(mapped, 0)
+        if magic != MAGIC or version != VERSION:
+            return None
+        index = marshal.loads(mapped[HEADER.size:HEADER.size + length])
+    except (OSError, ValueError, EOFError, TypeError, struct.error):
+        return None
+    return AssetPack(mapped, HEADER.size + length, index)
+
+
+class AssetPack(object):
+    """Assets read out of a mapped pack file"""
+    def __init__(self, mapped, start, index):
+        self.view = memoryview(mapped)
+        self.start = start
+        self.target = index['target']
+        self.sources = index['sources']
+        self.entries = index['entries']
+
+    def stale(self, sources, settings=None):
+        """Names of the sources that are new, gone or changed since the pack
+        was built, with '<target>' if the formats or settings changed.
+        Every source is hashed, whatever its size and mtime: the few MB of
+        sources take milliseconds, and a touch or checkout that changes
+        only the mtime doesn't rebuild the pack"""
+        changed = []
+        if self.target != target(settings):
+            changed.append('<target>')
+        keys = set(pack_key(source) for source in sources)
+        changed.extend(sorted(set(self.sources) - keys))
+        for source in sorted(sources):
+            record = self.sources.get(pack_key(source))
+            try:
+                if record is not None and record[2] == file_digest(source):
+                    continue
+            except OSError:
+                pass
+            changed.append(source)
+        return changed
+
+    def __contains__(self, path):
+        return pack_key(path) in self.entries
+
+    def data(self, entry):
+        start = self.start + entry[1]
+        return self.view[start:start + entry[2]]
+
+    def image(self, path):
+        """A surface sharing the mapped pixels, or None if the image isn't
+        in the pack"""
+        entry = self.entries.get(pack_key(path))
+        if entry is None or entry[0] == SOUND:
+            return None
+        kind, offset, size, width, height, colorkey = entry
+        image = pg.image.frombuffer(self.data(entry), (width, height), 'BGRA')
+        if colorkey is not None:
+            image = image.convert()
+            image.set_colorkey(colorkey)
+        return image
+
+    def sound(self, path):
+        """A Sound made from the stored samples, or None if the sound isn't
+        in the pack"""
+        entry = self.entries.get(pack_key(path))
+        if entry is None or entry[0] != SOUND:
+            return None
+        return pg.mixer.Sound(buffer=self.data(entry))
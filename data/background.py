@@ -0,0 +1,165 @@
+"""
+The level background, scaled a chunk at a time and seen through the
+camera.
+
+ChunkedBackground scales the level image in chunks a fixed number of
+pixels wide, only once something is about to draw from them, and keeps a
+bounded number of them.  Column x of the scaled background comes from
+column x * source width // scaled width of the image, and rows likewise,
+which is what pg.transform.scale does for the whole image, so the chunks
+put together are pixel for pixel the whole image scaled.
+
+ScrollingBackground keeps the screen-sized part of the background that
+was under the camera last frame.  When the camera moves sideways by less
+than a screen, the layer is shifted with Surface.scroll and only the strip
+that came into view is copied from the level image.  Any other move (a
+restart, a restored snapshot) redraws the whole layer.
+"""
+
+from collections import OrderedDict
+import pygame as pg
+
+
+class ChunkedBackground(object):
+    """image scaled by multiplier, made chunk_width pixels at a time.  At
+    most resident chunks are kept, the least recently drawn are dropped
+    first.  prefetch scales the chunks within lookahead pixels of an area
+    before they are drawn from"""
+    def __init__(self, image, multiplier, chunk_width, resident, lookahead=0):
+        self.image = image
+        width, height = image.get_size()
+        self.rect = pg.Rect(0, 0, int(width*multiplier), int(height*multiplier))
+        self.chunk_width = chunk_width
+        self.resident = resident
+        self.lookahead = lookahead
+        self.chunks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get_rect(self):
+        return self.rect.copy()
+
+    def get_size(self):
+        return self.rect.size
+
+    def chunk_numbers(self, area):
+        """First and last chunk overlapping area"""
+        area = area.clip(self.rect)
+        if not area:
+            return 0, -1
+        return (area.left // self.chunk_width,
+                (area.right - 1) // self.chunk_width)
+
+    def scale_chunk(self, number):
+        """The scaled columns of chunk number"""
+        source_width, source_height = self.image.get_size()
+        width, height = self.rect.size
+        left = number * self.chunk_width
+        right = min(left + self.chunk_width, width)
+        first = left * source_width // width
+        columns = (right - 1) * source_width // width - first + 1
+
+        # Scaling the rows, with every column repeated as often as the
+        # most any column appears in the scaled image, leaves a column
+        # run of any length to be copied with one blit
+        repeat = -(-width // source_width)
+        strip = self.image.subsurface((first, 0, columns, source_height))
+        wide = pg.transform.scale(strip, (columns * repeat, height))
+        wide.set_colorkey(None)
+
+        chunk = pg.Surface((right - left, height), wide.get_flags(), wide)
+        run_start = left
+        for x in range(left + 1, right + 1):
+            column = (x - 1) * source_width // width
+            if x == right or x * source_width // width != column:
+                # Max against the empty chunk copies alpha too
+                chunk.blit(wide, (run_start - left, 0),
+                           ((column - first) * repeat, 0, x - run_start, height),
+                           pg.BLEND_RGBA_MAX)
+                run_start = x
+        chunk.set_colorkey(self.image.get_colorkey())
+        return chunk
+
+    def chunk(self, number):
+        """Chunk number, scaled now if it isn't resident"""
+        chunk = self.chunks.get(number)
+        if chunk is not None:
+            self.hits += 1
+            self.chunks.move_to_end(number)
+            return chunk
+
+        self.misses += 1
+        chunk = self.scale_chunk(number)
+        self.chunks[number] = chunk
+        self.bytes += chunk.get_width() * chunk.get_height() * chunk.get_bytesize()
+        while len(self.chunks) > self.resident:
+            number, dropped = self.chunks.popitem(last=False)
+            self.bytes -= dropped.get_width() * dropped.get_height() * \
+                dropped.get_bytesize()
+        return chunk
+
+    def prefetch(self, area):
+        """Scales one missing chunk within lookahead pixels of area, if
+        there is one, so the work is spread over several frames"""
+        first, last = self.chunk_numbers(area.inflate(2 * self.lookahead, 0))
+        for number in range(first, last + 1):
+            if number not in self.chunks:
+                self.chunk(number)
+                return
+
+    def blit_area(self, surface, position, area):
+        """Blits the part of the scaled image inside area onto surface at
+        position, the same as surface.blit(image, position, area)"""
+        area = pg.Rect(area)
+        x = position[0] - area.x
+        y = position[1] - area.y
+        first, last = self.chunk_numbers(area)
+        for number in range(first, last + 1):
+            chunk = self.chunk(number)
+            left = number * self.chunk_width
+            part = area.clip(chunk.get_rect(x=left))
+            surface.blit(chunk, (x + part.x, y + part.y), part.move(-left, 0))
+
+    def stats(self):
+        return {'chunks': len(self.chunks),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes': self.bytes}
+
+
+class ScrollingBackground(object):
+    """A screen-sized layer over image, a ChunkedBackground in level
+    coordinates"""
+    def __init__(self, image, size):
+        self.image = image
+        self.layer = pg.Surface(size).convert()
+        self.camera = None
+
+    def update(self, camera):
+        """Brings the layer up to date with camera, a rect in level
+        coordinates of the layer's size"""
+        x, y = camera.topleft
+        width, height = self.layer.get_size()
+        if self.camera is None:
+            dx = dy = width
+        else:
+            dx = x - self.camera[0]
+            dy = y - self.camera[1]
+
+        if dy or abs(dx) >= width:
+            self.image.blit_area(self.layer, (0, 0), camera)
+        elif dx > 0:
+            self.layer.scroll(-dx, 0)
+            self.image.blit_area(self.layer, (width - dx, 0),
+                                 (x + width - dx, y, dx, height))
+        elif dx < 0:
+            self.layer.scroll(-dx, 0)
+            self.image.blit_area(self.layer, (0, 0), (x, y, -dx, height))
+        self.camera = (x, y)
+        self.image.prefetch(camera)
+
+    def draw(self, surface, camera):
+        """Blits the background under camera onto surface"""
+        self.update(camera)
+        surface.blit(self.layer, (0, 0))
@@ -0,0 +1,234 @@
+"""
+Spatial indexes used by Level1 to answer "what does this rect overlap"
+without testing every sprite in a group: TerrainGrid for the colliders that
+never move, SpatialGroup for the groups whose sprites do, and
+CollisionWorld to query them together.
+
+Every query returns sprites in the order of the group the index was made
+from, so it gives the same answer as pg.sprite.spritecollideany on that
+group.
+"""
+
+import bisect
+import pygame as pg
+from . import constants as c
+
+# One block of the level: 16 pixels of the original sheet, scaled
+TILE_SIZE = int(round(16 * c.BACKGROUND_MULTIPLER))
+
+# Cells of a SpatialGroup, about the size of the sprites kept in one
+CELL_SIZE = 2 * TILE_SIZE
+
+# CollisionWorld layers
+TERRAIN = 'terrain'
+COIN_BOX = 'coin box'
+BRICK = 'brick'
+ENEMY = 'enemy'
+SHELL = 'shell'
+POWERUP = 'powerup'
+
+# What actors stand on, in the order they are checked.  Mushrooms and
+# stars look at bricks before coin boxes
+SOLIDS = (TERRAIN, COIN_BOX, BRICK)
+ITEM_SOLIDS = (TERRAIN, BRICK, COIN_BOX)
+
+
+class TerrainGrid(object):
+    """The static colliders of a level (ground, pipes, steps) compiled into
+    columns one tile wide.  Each column holds the colliders overlapping it,
+    in group order, so a query only tests the one or two columns under the
+    rect, however long the level is.  The colliders must not move"""
+    def __init__(self, group, tile_size=TILE_SIZE):
+        self.sprites = group.sprites()
+        self.rects = [sprite.rect.copy() for sprite in self.sprites]
+        self.tile_size = tile_size
+        if self.rects:
+            bounds = self.rects[0].unionall(self.rects[1:])
+        else:
+            bounds = pg.Rect(0, 0, 0, 0)
+        self.left = bounds.left
+        self.columns = max(1, -(-bounds.width // tile_size))
+
+        numbers = [[] for i in range(self.columns)]
+        for number, rect in enumerate(self.rects):
+            first, last = self.columns_under(rect)
+            for column in range(first, last + 1):
+                numbers[column].append(number)
+        # rect.collidelist on a column gives the first hit in one call
+        self.column_numbers = [tuple(column) for column in numbers]
+        self.column_rects = [[self.rects[number] for number in column]
+                             for column in numbers]
+
+    def columns_under(self, rect):
+        """First and last column a rect overlaps, clipped to the grid"""
+        size = self.tile_size
+        return (max((rect.left - self.left) // size, 0),
+                min((rect.right - 1 - self.left) // size, self.columns - 1))
+
+    def collide_any(self, rect):
+        """The first collider, in group order, that overlaps rect, or
+        None"""
+        first, last = self.columns_under(rect)
+        found = None
+        for column in range(first, last + 1):
+            hit = rect.collidelist(self.column_rects[column])
+            if hit >= 0:
+                number = self.column_numbers[column][hit]
+                if found is None or number < found:
+                    found = number
+        if found is None:
+            return None
+        return self.sprites[found]
+
+    def collide_all(self, rect):
+        """Every collider overlapping rect, in group order"""
+        first, last = self.columns_under(rect)
+        numbers = set()
+        for column in range(first, last + 1):
+            for hit in rect.collidelistall(self.column_rects[column]):
+                numbers.add(self.column_numbers[column][hit])
+        return [self.sprites[number] for number in sorted(numbers)]
+
+
+class SpatialGroup(pg.sprite.Group):
+    """A sprite group that also keeps its sprites in a uniform grid of
+    cells, for groups whose sprites move (enemies, shells, bricks, coin
+    boxes, power ups).
+
+    Adding and removing sprites, kill() included, updates the grid.  Moving
+    a sprite doesn't: whoever moves it calls relocate(sprite) afterwards, or
+    sync() to pick up every sprite that moved since.  Each sprite gets a
+    sequence number when it is added, and cells list their sprites by
+    sequence, so a query can stop at the first hit in group order"""
+    def __init__(self, *sprites, **kwargs):
+        self.cell_size = kwargs.get('cell_size', CELL_SIZE)
+        self.cells = {}
+        self.placed = {}
+        self.next_sequence = 0
+        pg.sprite.Group.__init__(self, *sprites)
+
+    def add_internal(self, sprite, layer=None):
+        pg.sprite.Group.add_internal(self, sprite)
+        entry = (self.next_sequence, sprite)
+        self.next_sequence += 1
+        keys = self.cells_under(sprite.rect)
+        for key in keys:
+            # Newest sprite, so it goes last
+            self.cells.setdefault(key, []).append(entry)
+        self.placed[sprite] = (entry, self.rect_key(sprite), keys)
+
+    def remove_internal(self, sprite):
+        pg.sprite.Group.remove_internal(self, sprite)
+        entry, rect, keys = self.placed.pop(sprite)
+        for key in keys:
+            self.leave(key, entry)
+
+    @staticmethod
+    def rect_key(sprite):
+        rect = sprite.rect
+        return (rect.x, rect.y, rect.w, rect.h)
+
+    def cells_under(self, rect):
+        size = self.cell_size
+        return [(column, row)
+                for column in range(rect.left // size, (rect.right - 1) // size + 1)
+                for row in range(rect.top // size, (rect.bottom - 1) // size + 1)]
+
+    def leave(self, key, entry):
+        cell = self.cells[key]
+        cell.remove(entry)
+        if not cell:
+            del self.cells[key]
+
+    def relocate(self, sprite):
+        """Moves a sprite to the cells under its rect, if it has moved"""
+        placed = self.placed.get(sprite)
+        if placed is None:
+            return
+        entry, rect, keys = placed
+        new_rect = self.rect_key(sprite)
+        if new_rect == rect:
+            return
+        new_keys = self.cells_under(sprite.rect)
+        if new_keys != keys:
+            for key in keys:
+                if key not in new_keys:
+                    self.leave(key, entry)
+            for key in new_keys:
+                if key not in keys:
+                    bisect.insort(self.cells.setdefault(key, []), entry)
+        self.placed[sprite] = (entry, new_rect, new_keys)
+
+    def sync(self):
+        """Relocates every sprite that moved"""
+        for sprite in self.spritedict:
+            self.relocate(sprite)
+
+    def collide_any(self, rect):
+        """The first sprite, in group order, that overlaps rect, or None"""
+        found = None
+        first = self.next_sequence
+        cells = self.cells
+        size = self.cell_size
+        rows = range(rect.top // size, (rect.bottom - 1) // size + 1)
+        for column in range(rect.left // size, (rect.right - 1) // size + 1):
+            for row in rows:
+                cell = cells.get((column, row))
+                if cell:
+                    for sequence, sprite in cell:
+                        if sequence >= first:
+                            break
+                        if sprite.rect.colliderect(rect):
+                            first = sequence
+                            found = sprite
+                            break
+        return found
+
+    def collide_all(self, rect):
+        """Every sprite overlapping rect, in group order"""
+        found = set()
+        for key in self.cells_under(rect):
+            for entry in self.cells.get(key, ()):
+                if entry[1].rect.colliderect(rect):
+                    found.add(entry)
+        return [sprite for sequence, sprite in sorted(found)]
+
+
+class CollisionWorld(object):
+    """The collision indexes of a level as named layers, so one query per
+    actor finds everything it touches.  layers is a list of (category,
+    index) pairs; each index is a TerrainGrid or a SpatialGroup"""
+    def __init__(self, layers):
+        self.layers = list(layers)
+        self.categories = tuple(category for category, layer in self.layers)
+        self.index = dict(self.layers)
+
+    def contacts(self, rect, categories=None):
+        """Maps each category with a sprite overlapping rect to the first
+        such sprite in that layer's group order"""
+        found = {}
+        index = self.index
+        for category in categories or self.categories:
+            sprite = index[category].collide_any(rect)
+            if sprite is not None:
+                found[category] = sprite
+        return found
+
+    def collide_any(self, rect, categories=None):
+        """The first sprite overlapping rect, trying the layers in the order
+        of categories, or None"""
+        index = self.index
+        for category in categories or self.categories:
+            sprite = index[category].collide_any(rect)
+            if sprite is not None:
+                return sprite
+        return None
+
+    def sync(self):
+        """Catches the moving layers up with sprites that moved"""
+        for category, layer in self.layers:
+            if isinstance(layer, SpatialGroup):
+                layer.sync()
+
+    def relocate(self, category, sprite):
+        self.index[category].relocate(sprite)
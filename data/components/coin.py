@@ -1,7 +1,7 @@
 __author__ = 'justinarmstrong'
 
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 from . import score
 
@@ -28,17 +28,8 @@ class Coin(pg.sprite.Sprite):
 
     def get_image(self, x, y, width, height):
         """Get the image frames from the sprite sheet"""
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-
-
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.SIZE_MULTIPLIER)
 
 
     def setup_frames(self):
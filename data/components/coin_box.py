@@ -1,7 +1,7 @@
 __author__ = 'justinarmstrong'
 
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 from . import powerups
 from . import coin
@@ -11,7 +11,7 @@ from data import constants as const
 
 class Coin_box(pg.sprite.Sprite):
     """Coin box sprite"""
-    def __init__(self, x, y, contents='coin', group=None):
+    def __init__(self, x, y, contents='coin', group=None, slide=True):
         pg.sprite.Sprite.__init__(self)
         self.sprite_sheet = setup.GFX['tile_set']
         self.frames = []
@@ -30,20 +30,13 @@ class Coin_box(pg.sprite.Sprite):
         self.y_vel = 0
         self.contents = contents
         self.group = group
+        self.slide = slide   # Si abre la siguiente diapositiva al golpearla
 
 
     def get_image(self, x, y, width, height):
         """Extract image from sprite sheet"""
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.BRICK_SIZE_MULTIPLIER),
-                                    int(rect.height*c.BRICK_SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.BRICK_SIZE_MULTIPLIER)
 
     def opened(self):
         """Estado vacío para cuando la caja ya está abierta."""
@@ -104,6 +97,17 @@ class Coin_box(pg.sprite.Sprite):
         self.image = self.frames[self.frame_index]
 
 
+    def follow(self, clock):
+        """Takes the resting animation of clock, a box that is never put to
+        sleep, so a box waking up shimmers in step with the others"""
+        if (self.frame_index, self.animation_timer, self.first_half) != \
+                (clock.frame_index, clock.animation_timer, clock.first_half):
+            self.frame_index = clock.frame_index
+            self.animation_timer = clock.animation_timer
+            self.first_half = clock.first_half
+            self.image = self.frames[self.frame_index]
+
+
     def bumped(self):
         """Action after Mario has bumped the box from below"""
         self.rect.y += self.y_vel
@@ -169,7 +173,7 @@ class Coin_box(pg.sprite.Sprite):
         # --- Activar solicitud de popup ---
         import data.constants as const
 
-        if const.DIAPOSITIVA_INDEX < len(const.DIAPOSITIVAS):
+        if self.slide and const.DIAPOSITIVA_INDEX < len(const.DIAPOSITIVAS):
             const.POPUP_ACTIVE = True
             const.REQUEST_POPUP_TEXT = const.DIAPOSITIVAS[const.DIAPOSITIVA_INDEX]
 
@@ -2,7 +2,7 @@ __author__ = 'justinarmstrong'
 
 
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 
 
@@ -43,19 +43,10 @@ class Enemy(pg.sprite.Sprite):
         self.y_vel = 0
 
 
-    def get_image(self, x, y, width, height):
+    def get_image(self, x, y, width, height, flip=(False, False)):
         """Get the image frames from the sprite sheet"""
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-
-
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.SIZE_MULTIPLIER, flip=flip)
 
 
     def handle_state(self):
@@ -147,7 +138,8 @@ class Goomba(Enemy):
             self.get_image(30, 4, 16, 16))
         self.frames.append(
             self.get_image(61, 0, 16, 16))
-        self.frames.append(pg.transform.flip(self.frames[1], False, True))
+        self.frames.append(
+            self.get_image(30, 4, 16, 16, flip=(False, True)))
 
 
     def jumped_on(self):
@@ -174,7 +166,8 @@ class Koopa(Enemy):
             self.get_image(180, 0, 16, 24))
         self.frames.append(
             self.get_image(360, 5, 16, 15))
-        self.frames.append(pg.transform.flip(self.frames[2], False, True))
+        self.frames.append(
+            self.get_image(360, 5, 16, 15, flip=(False, True)))
 
 
     def jumped_on(self):
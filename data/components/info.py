@@ -1,7 +1,7 @@
 __author__ = 'justinarmstrong'
 
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 from . import flashing_coin
 
@@ -98,15 +98,8 @@ class OverheadInfo(object):
 
     def get_image(self, x, y, width, height):
         """Extracts image from sprite sheet"""
-        image = pg.Surface([width, height])
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey((92, 148, 252))
-        image = pg.transform.scale(image,
-                                   (int(rect.width*2.9),
-                                    int(rect.height*2.9)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               2.9, (92, 148, 252))
 
 
     def create_score_group(self):
@@ -302,6 +295,11 @@ class OverheadInfo(object):
         elif (level_info[c.CURRENT_TIME] - self.current_time) > 400:
             self.current_time = level_info[c.CURRENT_TIME]
             self.time -= 1
+        self.set_count_down_images()
+
+
+    def set_count_down_images(self):
+        """Creates the labels for the time remaining"""
         self.count_down_images = []
         self.create_label(self.count_down_images, str(self.time), 645, 55)
         if len(self.count_down_images) < 2:
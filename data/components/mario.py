@@ -1,10 +1,211 @@
 __author__ = 'justinarmstrong'
 
+import os
+import marshal
 import pygame as pg
 from .. import setup, tools
 from .. import constants as c
 from . import powerups
 
+# Rects of Mario's right facing frames on the mario_bros sheet, by
+# (size, palette), in pose order.  Left frames are flipped copies.
+FRAME_RECTS = {
+    ('small', 'normal'): [
+        (178, 32, 12, 16),    # Right [0]
+        (80, 32, 15, 16),     # Right walking 1 [1]
+        (96, 32, 16, 16),     # Right walking 2 [2]
+        (112, 32, 16, 16),    # Right walking 3 [3]
+        (144, 32, 16, 16),    # Right jump [4]
+        (130, 32, 14, 16),    # Right skid [5]
+        (160, 32, 15, 16),    # Death frame [6]
+        (320, 8, 16, 24),     # Transition small to big [7]
+        (241, 33, 16, 16),    # Transition big to small [8]
+        (194, 32, 12, 16),    # Frame 1 of flag pole Slide [9]
+        (210, 33, 12, 16),    # Frame 2 of flag pole slide [10]
+    ],
+    ('small', 'green'): [
+        (178, 224, 12, 16),   # Right standing [0]
+        (80, 224, 15, 16),    # Right walking 1 [1]
+        (96, 224, 16, 16),    # Right walking 2 [2]
+        (112, 224, 15, 16),   # Right walking 3 [3]
+        (144, 224, 16, 16),   # Right jump [4]
+        (130, 224, 14, 16),   # Right skid [5]
+    ],
+    ('small', 'red'): [
+        (178, 272, 12, 16),   # Right standing [0]
+        (80, 272, 15, 16),    # Right walking 1 [1]
+        (96, 272, 16, 16),    # Right walking 2 [2]
+        (112, 272, 15, 16),   # Right walking 3 [3]
+        (144, 272, 16, 16),   # Right jump [4]
+        (130, 272, 14, 16),   # Right skid [5]
+    ],
+    ('small', 'black'): [
+        (178, 176, 12, 16),   # Right standing [0]
+        (80, 176, 15, 16),    # Right walking 1 [1]
+        (96, 176, 16, 16),    # Right walking 2 [2]
+        (112, 176, 15, 16),   # Right walking 3 [3]
+        (144, 176, 16, 16),   # Right jump [4]
+        (130, 176, 14, 16),   # Right skid [5]
+    ],
+    ('big', 'normal'): [
+        (176, 0, 16, 32),     # Right standing [0]
+        (81, 0, 16, 32),      # Right walking 1 [1]
+        (97, 0, 15, 32),      # Right walking 2 [2]
+        (113, 0, 15, 32),     # Right walking 3 [3]
+        (144, 0, 16, 32),     # Right jump [4]
+        (128, 0, 16, 32),     # Right skid [5]
+        (336, 0, 16, 32),     # Right throwing [6]
+        (160, 10, 16, 22),    # Right crouching [7]
+        (272, 2, 16, 29),     # Transition big to small [8]
+        (193, 2, 16, 30),     # Frame 1 of flag pole slide [9]
+        (209, 2, 16, 29),     # Frame 2 of flag pole slide [10]
+    ],
+    ('big', 'green'): [
+        (176, 192, 16, 32),   # Right standing [0]
+        (81, 192, 16, 32),    # Right walking 1 [1]
+        (97, 192, 15, 32),    # Right walking 2 [2]
+        (113, 192, 15, 32),   # Right walking 3 [3]
+        (144, 192, 16, 32),   # Right jump [4]
+        (128, 192, 16, 32),   # Right skid [5]
+        (336, 192, 16, 32),   # Right throwing [6]
+        (160, 202, 16, 22),   # Right Crouching [7]
+    ],
+    ('big', 'red'): [
+        (176, 240, 16, 32),   # Right standing [0]
+        (81, 240, 16, 32),    # Right walking 1 [1]
+        (97, 240, 15, 32),    # Right walking 2 [2]
+        (113, 240, 15, 32),   # Right walking 3 [3]
+        (144, 240, 16, 32),   # Right jump [4]
+        (128, 240, 16, 32),   # Right skid [5]
+        (336, 240, 16, 32),   # Right throwing [6]
+        (160, 250, 16, 22),   # Right crouching [7]
+    ],
+    ('big', 'black'): [
+        (176, 144, 16, 32),   # Right standing [0]
+        (81, 144, 16, 32),    # Right walking 1 [1]
+        (97, 144, 15, 32),    # Right walking 2 [2]
+        (113, 144, 15, 32),   # Right walking 3 [3]
+        (144, 144, 16, 32),   # Right jump [4]
+        (128, 144, 16, 32),   # Right skid [5]
+        (336, 144, 16, 32),   # Right throwing [6]
+        (160, 154, 16, 22),   # Right Crouching [7]
+    ],
+    ('big', 'fire'): [
+        (176, 48, 16, 32),    # Right standing [0]
+        (81, 48, 16, 32),     # Right walking 1 [1]
+        (97, 48, 15, 32),     # Right walking 2 [2]
+        (113, 48, 15, 32),    # Right walking 3 [3]
+        (144, 48, 16, 32),    # Right jump [4]
+        (128, 48, 16, 32),    # Right skid [5]
+        (336, 48, 16, 32),    # Right throwing [6]
+        (160, 58, 16, 22),    # Right crouching [7]
+        (0, 0, 0, 0),         # Place holder [8]
+        (193, 50, 16, 29),    # Frame 1 of flag pole slide [9]
+        (209, 50, 16, 29),    # Frame 2 of flag pole slide [10]
+    ],
+}
+ATLAS_VERSION = 1
+ATLAS_FILE = 'mario_atlas.bin'
+
+_atlas = None
+
+
+class MarioAtlas(object):
+    """Every Mario frame, keyed by (size, palette, direction, pose).  Built
+    once per process and shared by all Mario instances, so the frames and
+    frame lists must not be changed"""
+    def __init__(self, frames):
+        self.frames = frames
+        self.frame_lists = {}
+        for size, palette in FRAME_RECTS:
+            poses = len(FRAME_RECTS[(size, palette)])
+            for direction in (c.RIGHT, c.LEFT):
+                self.frame_lists[(size, palette, direction)] = tuple(
+                    frames[(size, palette, direction, pose)]
+                    for pose in range(poses))
+
+    def frame_list(self, size, palette, direction):
+        return self.frame_lists[(size, palette, direction)]
+
+    @classmethod
+    def from_sheet(cls, sprite_sheet):
+        """Slices and scales the frames from the sprite sheet"""
+        frames = {}
+        for (size, palette), rects in FRAME_RECTS.items():
+            for pose, rect in enumerate(rects):
+                frames[(size, palette, c.RIGHT, pose)] = tools.get_image(
+                    sprite_sheet, *rect, scale=c.SIZE_MULTIPLIER)
+                frames[(size, palette, c.LEFT, pose)] = tools.get_image(
+                    sprite_sheet, *rect, scale=c.SIZE_MULTIPLIER,
+                    flip=(True, False))
+        return cls(frames)
+
+    @classmethod
+    def load(cls, path, source):
+        """Reads an atlas written by save, or returns None if the file is
+        missing or was made from a different sheet"""
+        try:
+            with open(path, 'rb') as atlas_file:
+                data = marshal.load(atlas_file)
+        except (OSError, EOFError, ValueError, TypeError):
+            return None
+        if not isinstance(data, dict) or data.get('version') != ATLAS_VERSION \
+                or data.get('source') != source:
+            return None
+
+        frames = {}
+        for (size, palette, pose), (width, height, pixels) in data['frames'].items():
+            if width and height:
+                image = pg.image.fromstring(pixels, (width, height), 'RGB').convert()
+            else:
+                image = pg.Surface((width, height)).convert()
+            image.set_colorkey(c.BLACK)
+            frames[(size, palette, c.RIGHT, pose)] = image
+            frames[(size, palette, c.LEFT, pose)] = \
+                pg.transform.flip(image, True, False)
+        return cls(frames)
+
+    def save(self, path, source):
+        """Writes the right facing frames out as raw pixels.  Not being
+        able to write the cache is not an error"""
+        frames = {}
+        for (size, palette, direction, pose), image in self.frames.items():
+            if direction == c.RIGHT:
+                width, height = image.get_size()
+                frames[(size, palette, pose)] = (
+                    width, height, pg.image.tostring(image, 'RGB'))
+        data = {'version': ATLAS_VERSION, 'source': source, 'frames': frames}
+        try:
+            if not os.path.isdir(os.path.dirname(path)):
+                os.makedirs(os.path.dirname(path))
+            with open(path, 'wb') as atlas_file:
+                marshal.dump(data, atlas_file)
+        except OSError:
+            pass
+
+
+def atlas_source():
+    """Identifies the sheet and scale the atlas is built from"""
+    path = setup.GFX.paths['mario_bros']
+    stat = os.stat(path)
+    return (path, stat.st_size, int(stat.st_mtime), c.SIZE_MULTIPLIER)
+
+
+def get_atlas():
+    """Returns the shared Mario atlas, reading it from the disk cache or
+    building it the first time"""
+    global _atlas
+    if _atlas is None:
+        path = os.path.join(setup.CACHE_DIRECTORY, ATLAS_FILE)
+        source = atlas_source()
+        _atlas = MarioAtlas.load(path, source)
+        if _atlas is None:
+            _atlas = MarioAtlas.from_sheet(setup.GFX['mario_bros'])
+            _atlas.save(path, source)
+    return _atlas
+
+
+
 
 class Mario(pg.sprite.Sprite):
     def __init__(self):
@@ -53,6 +254,9 @@ class Mario(pg.sprite.Sprite):
         self.in_castle = False
         self.crouching = False
         self.losing_invincibility = False
+        # Off while blinking after getting hurt.  The frames belong to the
+        # shared atlas, so the blink can't touch their alpha
+        self.visible = True
 
 
     def setup_forces(self):
@@ -76,253 +280,16 @@ class Mario(pg.sprite.Sprite):
 
 
     def load_images_from_sheet(self):
-        """Extracts Mario images from his sprite sheet and assigns
-        them to appropriate lists"""
-        self.right_frames = []
-        self.left_frames = []
-
-        self.right_small_normal_frames = []
-        self.left_small_normal_frames = []
-        self.right_small_green_frames = []
-        self.left_small_green_frames = []
-        self.right_small_red_frames = []
-        self.left_small_red_frames = []
-        self.right_small_black_frames = []
-        self.left_small_black_frames = []
-
-        self.right_big_normal_frames = []
-        self.left_big_normal_frames = []
-        self.right_big_green_frames = []
-        self.left_big_green_frames = []
-        self.right_big_red_frames = []
-        self.left_big_red_frames = []
-        self.right_big_black_frames = []
-        self.left_big_black_frames = []
-
-        self.right_fire_frames = []
-        self.left_fire_frames = []
-
-
-        #Images for normal small mario#
-
-        self.right_small_normal_frames.append(
-            self.get_image(178, 32, 12, 16))  # Right [0]
-        self.right_small_normal_frames.append(
-            self.get_image(80,  32, 15, 16))  # Right walking 1 [1]
-        self.right_small_normal_frames.append(
-            self.get_image(96,  32, 16, 16))  # Right walking 2 [2]
-        self.right_small_normal_frames.append(
-            self.get_image(112,  32, 16, 16))  # Right walking 3 [3]
-        self.right_small_normal_frames.append(
-            self.get_image(144, 32, 16, 16))  # Right jump [4]
-        self.right_small_normal_frames.append(
-            self.get_image(130, 32, 14, 16))  # Right skid [5]
-        self.right_small_normal_frames.append(
-            self.get_image(160, 32, 15, 16))  # Death frame [6]
-        self.right_small_normal_frames.append(
-            self.get_image(320, 8, 16, 24))  # Transition small to big [7]
-        self.right_small_normal_frames.append(
-            self.get_image(241, 33, 16, 16))  # Transition big to small [8]
-        self.right_small_normal_frames.append(
-            self.get_image(194, 32, 12, 16))  # Frame 1 of flag pole Slide [9]
-        self.right_small_normal_frames.append(
-            self.get_image(210, 33, 12, 16))  # Frame 2 of flag pole slide [10]
-
-
-        #Images for small green mario (for invincible animation)#
-
-        self.right_small_green_frames.append(
-            self.get_image(178, 224, 12, 16))  # Right standing [0]
-        self.right_small_green_frames.append(
-            self.get_image(80, 224, 15, 16))  # Right walking 1 [1]
-        self.right_small_green_frames.append(
-            self.get_image(96, 224, 16, 16))  # Right walking 2 [2]
-        self.right_small_green_frames.append(
-            self.get_image(112, 224, 15, 16))  # Right walking 3 [3]
-        self.right_small_green_frames.append(
-            self.get_image(144, 224, 16, 16))  # Right jump [4]
-        self.right_small_green_frames.append(
-            self.get_image(130, 224, 14, 16))  # Right skid [5]
-
-        #Images for red mario (for invincible animation)#
-
-        self.right_small_red_frames.append(
-            self.get_image(178, 272, 12, 16))  # Right standing [0]
-        self.right_small_red_frames.append(
-            self.get_image(80, 272, 15, 16))  # Right walking 1 [1]
-        self.right_small_red_frames.append(
-            self.get_image(96, 272, 16, 16))  # Right walking 2 [2]
-        self.right_small_red_frames.append(
-            self.get_image(112, 272, 15, 16))  # Right walking 3 [3]
-        self.right_small_red_frames.append(
-            self.get_image(144, 272, 16, 16))  # Right jump [4]
-        self.right_small_red_frames.append(
-            self.get_image(130, 272, 14, 16))  # Right skid [5]
-
-        #Images for black mario (for invincible animation)#
-
-        self.right_small_black_frames.append(
-            self.get_image(178, 176, 12, 16))  # Right standing [0]
-        self.right_small_black_frames.append(
-            self.get_image(80, 176, 15, 16))  # Right walking 1 [1]
-        self.right_small_black_frames.append(
-            self.get_image(96, 176, 16, 16))  # Right walking 2 [2]
-        self.right_small_black_frames.append(
-            self.get_image(112, 176, 15, 16))  # Right walking 3 [3]
-        self.right_small_black_frames.append(
-            self.get_image(144, 176, 16, 16))  # Right jump [4]
-        self.right_small_black_frames.append(
-            self.get_image(130, 176, 14, 16))  # Right skid [5]
-
-
-        #Images for normal big Mario
-
-        self.right_big_normal_frames.append(
-            self.get_image(176, 0, 16, 32))  # Right standing [0]
-        self.right_big_normal_frames.append(
-            self.get_image(81, 0, 16, 32))  # Right walking 1 [1]
-        self.right_big_normal_frames.append(
-            self.get_image(97, 0, 15, 32))  # Right walking 2 [2]
-        self.right_big_normal_frames.append(
-            self.get_image(113, 0, 15, 32))  # Right walking 3 [3]
-        self.right_big_normal_frames.append(
-            self.get_image(144, 0, 16, 32))  # Right jump [4]
-        self.right_big_normal_frames.append(
-            self.get_image(128, 0, 16, 32))  # Right skid [5]
-        self.right_big_normal_frames.append(
-            self.get_image(336, 0, 16, 32))  # Right throwing [6]
-        self.right_big_normal_frames.append(
-            self.get_image(160, 10, 16, 22))  # Right crouching [7]
-        self.right_big_normal_frames.append(
-            self.get_image(272, 2, 16, 29))  # Transition big to small [8]
-        self.right_big_normal_frames.append(
-            self.get_image(193, 2, 16, 30))  # Frame 1 of flag pole slide [9]
-        self.right_big_normal_frames.append(
-            self.get_image(209, 2, 16, 29))  # Frame 2 of flag pole slide [10]
-
-        #Images for green big Mario#
-
-        self.right_big_green_frames.append(
-            self.get_image(176, 192, 16, 32))  # Right standing [0]
-        self.right_big_green_frames.append(
-            self.get_image(81, 192, 16, 32))  # Right walking 1 [1]
-        self.right_big_green_frames.append(
-            self.get_image(97, 192, 15, 32))  # Right walking 2 [2]
-        self.right_big_green_frames.append(
-            self.get_image(113, 192, 15, 32))  # Right walking 3 [3]
-        self.right_big_green_frames.append(
-            self.get_image(144, 192, 16, 32))  # Right jump [4]
-        self.right_big_green_frames.append(
-            self.get_image(128, 192, 16, 32))  # Right skid [5]
-        self.right_big_green_frames.append(
-            self.get_image(336, 192, 16, 32))  # Right throwing [6]
-        self.right_big_green_frames.append(
-            self.get_image(160, 202, 16, 22))  # Right Crouching [7]
-
-        #Images for red big Mario#
-
-        self.right_big_red_frames.append(
-            self.get_image(176, 240, 16, 32))  # Right standing [0]
-        self.right_big_red_frames.append(
-            self.get_image(81, 240, 16, 32))  # Right walking 1 [1]
-        self.right_big_red_frames.append(
-            self.get_image(97, 240, 15, 32))  # Right walking 2 [2]
-        self.right_big_red_frames.append(
-            self.get_image(113, 240, 15, 32))  # Right walking 3 [3]
-        self.right_big_red_frames.append(
-            self.get_image(144, 240, 16, 32))  # Right jump [4]
-        self.right_big_red_frames.append(
-            self.get_image(128, 240, 16, 32))  # Right skid [5]
-        self.right_big_red_frames.append(
-            self.get_image(336, 240, 16, 32))  # Right throwing [6]
-        self.right_big_red_frames.append(
-            self.get_image(160, 250, 16, 22))  # Right crouching [7]
-
-        #Images for black big Mario#
-
-        self.right_big_black_frames.append(
-            self.get_image(176, 144, 16, 32))  # Right standing [0]
-        self.right_big_black_frames.append(
-            self.get_image(81, 144, 16, 32))  # Right walking 1 [1]
-        self.right_big_black_frames.append(
-            self.get_image(97, 144, 15, 32))  # Right walking 2 [2]
-        self.right_big_black_frames.append(
-            self.get_image(113, 144, 15, 32))  # Right walking 3 [3]
-        self.right_big_black_frames.append(
-            self.get_image(144, 144, 16, 32))  # Right jump [4]
-        self.right_big_black_frames.append(
-            self.get_image(128, 144, 16, 32))  # Right skid [5]
-        self.right_big_black_frames.append(
-            self.get_image(336, 144, 16, 32))  # Right throwing [6]
-        self.right_big_black_frames.append(
-            self.get_image(160, 154, 16, 22))  # Right Crouching [7]
-
-
-        #Images for Fire Mario#
-
-        self.right_fire_frames.append(
-            self.get_image(176, 48, 16, 32))  # Right standing [0]
-        self.right_fire_frames.append(
-            self.get_image(81, 48, 16, 32))  # Right walking 1 [1]
-        self.right_fire_frames.append(
-            self.get_image(97, 48, 15, 32))  # Right walking 2 [2]
-        self.right_fire_frames.append(
-            self.get_image(113, 48, 15, 32))  # Right walking 3 [3]
-        self.right_fire_frames.append(
-            self.get_image(144, 48, 16, 32))  # Right jump [4]
-        self.right_fire_frames.append(
-            self.get_image(128, 48, 16, 32))  # Right skid [5]
-        self.right_fire_frames.append(
-            self.get_image(336, 48, 16, 32))  # Right throwing [6]
-        self.right_fire_frames.append(
-            self.get_image(160, 58, 16, 22))  # Right crouching [7]
-        self.right_fire_frames.append(
-            self.get_image(0, 0, 0, 0))  # Place holder [8]
-        self.right_fire_frames.append(
-            self.get_image(193, 50, 16, 29))  # Frame 1 of flag pole slide [9]
-        self.right_fire_frames.append(
-            self.get_image(209, 50, 16, 29))  # Frame 2 of flag pole slide [10]
-
-
-        #The left image frames are numbered the same as the right
-        #frames but are simply reversed.
-
-        for frame in self.right_small_normal_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_small_normal_frames.append(new_image)
-
-        for frame in self.right_small_green_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_small_green_frames.append(new_image)
-
-        for frame in self.right_small_red_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_small_red_frames.append(new_image)
-
-        for frame in self.right_small_black_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_small_black_frames.append(new_image)
-
-        for frame in self.right_big_normal_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_big_normal_frames.append(new_image)
-
-        for frame in self.right_big_green_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_big_green_frames.append(new_image)
-
-        for frame in self.right_big_red_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_big_red_frames.append(new_image)
-
-        for frame in self.right_big_black_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_big_black_frames.append(new_image)
-
-        for frame in self.right_fire_frames:
-            new_image = pg.transform.flip(frame, True, False)
-            self.left_fire_frames.append(new_image)
-
+        """Takes Mario's frames from the shared atlas and assigns them to
+        appropriate lists"""
+        atlas = get_atlas()
+        for size, palette in FRAME_RECTS:
+            for direction in (c.RIGHT, c.LEFT):
+                if palette == 'fire':
+                    name = '{}_fire_frames'.format(direction)
+                else:
+                    name = '{}_{}_{}_frames'.format(direction, size, palette)
+                setattr(self, name, atlas.frame_list(size, palette, direction))
 
         self.normal_small_frames = [self.right_small_normal_frames,
                               self.left_small_normal_frames]
@@ -378,24 +345,10 @@ class Mario(pg.sprite.Sprite):
                            self.left_small_green_frames,
                            self.left_small_black_frames]
 
-
         self.right_frames = self.normal_small_frames[0]
         self.left_frames = self.normal_small_frames[1]
 
 
-    def get_image(self, x, y, width, height):
-        """Extracts image from sprite sheet"""
-        image = pg.Surface([width, height])
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
-        return image
-
-
     def update(self, keys, game_info, fire_group):
         """Updates Mario's states and animations once per frame"""
         self.current_time = game_info[c.CURRENT_TIME]
@@ -1085,9 +1038,7 @@ class Mario(pg.sprite.Sprite):
                 self.hurt_invincible = False
                 self.hurt_invisible_timer = 0
                 self.hurt_invisible_timer2 = 0
-                for frames in self.all_images:
-                    for image in frames:
-                        image.set_alpha(255)
+                self.visible = True
 
 
     def hurt_invincible_check(self):
@@ -1095,9 +1046,9 @@ class Mario(pg.sprite.Sprite):
         if self.hurt_invisible_timer == 0:
             self.hurt_invisible_timer = self.current_time
         elif (self.current_time - self.hurt_invisible_timer) < 35:
-            self.image.set_alpha(0)
+            self.visible = False
         elif (self.current_time - self.hurt_invisible_timer) < 70:
-            self.image.set_alpha(255)
+            self.visible = True
             self.hurt_invisible_timer = self.current_time
 
 
@@ -1,7 +1,23 @@
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 
+# Tamaño del diálogo por defecto
+DIALOG_W = 700
+DIALOG_H = 360
+PADDING = 16
+TEXT_SPACE = 40  # espacio bajo la imagen para el texto
+
+
+def slide_area(dialog_w=DIALOG_W, dialog_h=DIALOG_H, padding=PADDING):
+    """Espacio (ancho, alto) donde cabe la diapositiva dentro del diálogo."""
+    return (dialog_w - (padding * 2), dialog_h - (padding * 2) - TEXT_SPACE)
+
+
+# Diapositivas ya escaladas, compartidas por todos los diálogos.  Las
+# siguientes a DIAPOSITIVA_INDEX se cargan en segundo plano (ver prefetch)
+SLIDES = tools.SlideCache(setup.load_slide, c.SLIDE_CACHE_SIZE)
+
 
 class PopupText:
     """Muestra una diapositiva como un cuadro de diálogo amigable.
@@ -15,19 +31,24 @@ class PopupText:
     def __init__(self):
         self.active = False
         self.image = None
+        self.image_path = None
 
         # Tamaño del diálogo (ajustable)
-        self.dialog_w = 700
-        self.dialog_h = 360
-        self.padding = 16
+        self.dialog_w = DIALOG_W
+        self.dialog_h = DIALOG_H
+        self.padding = PADDING
         self.border_radius = 12
 
         # Animación de entrada
         self._anim_progress = 0.0  # 0..1
         self._anim_speed = 0.12
 
-        # Superficies y fuentes cacheadas
+        # Superficies y fuentes cacheadas: el marco del diálogo se dibuja
+        # una sola vez, el diálogo con la diapositiva una vez por
+        # diapositiva y la capa oscura una vez por tamaño de pantalla
+        self._chrome = None
         self._dialog_surf = None
+        self._overlay = None
         self._font = None
         # Cargar iconos decorativos desde el sprite sheet
         self._icons = []
@@ -39,24 +60,83 @@ class PopupText:
         except Exception:
             # Si falla (por ejemplo en tests sin resources), dejar lista vacía
             self._icons = []
-
+        self.prefetch()
 
     def show(self, image_path):
         print(f"📸 Cargando diapositiva: {image_path}")
-        self.image = pg.image.load(image_path).convert_alpha()
-        # Escalar la imagen para que quepa dentro del contenido del diálogo
-        max_w = self.dialog_w - (self.padding * 2)
-        max_h = self.dialog_h - (self.padding * 2) - 40  # dejar espacio para texto
-        iw, ih = self.image.get_size()
-        scale = min(max_w / iw, max_h / ih, 1)
-        new_size = (max(1, int(iw * scale)), max(1, int(ih * scale)))
-        self.image = pg.transform.smoothscale(self.image, new_size)
+        self.image_path = image_path
+        # Imagen escalada para que quepa dentro del contenido del diálogo,
+        # normalmente ya cargada en segundo plano por prefetch
+        self.image = SLIDES.get(image_path, self._slide_area())
 
         self.active = True
         self._anim_progress = 0.0
+        self._dialog_surf = self._build_dialog()
+
+    def _slide_area(self):
+        return slide_area(self.dialog_w, self.dialog_h, self.padding)
+
+    def prefetch(self):
+        """Pide cargar en segundo plano las próximas diapositivas, desde
+        DIAPOSITIVA_INDEX, para que show no tenga que esperar al disco."""
+        SLIDES.prefetch(c.DIAPOSITIVAS[c.DIAPOSITIVA_INDEX:], self._slide_area())
+
+    def _build_chrome(self):
+        """Fondo, borde y marco decorativo del cuadro, que no cambian entre
+        diapositivas.  Los iconos y el texto de instrucción se dibujan
+        encima en _build_dialog."""
+        chrome = pg.Surface((self.dialog_w, self.dialog_h), pg.SRCALPHA)
+        # Fondo del cuadro
+        bg_color = (245, 245, 245, 255)
+        pg.draw.rect(chrome, bg_color, (0, 0, self.dialog_w, self.dialog_h), border_radius=self.border_radius)
+        # Borde
+        border_color = (50, 50, 60)
+        pg.draw.rect(chrome, border_color, (0, 0, self.dialog_w, self.dialog_h), width=3, border_radius=self.border_radius)
+
+        # Marco decorativo adicional (líneas/acento estilo juego)
+        self._draw_decorative_frame(chrome)
+        return chrome
 
+    def _build_dialog(self):
+        """El diálogo completo de la diapositiva actual, listo para
+        copiarse a la pantalla en cada frame."""
         if not self._font:
             self._font = pg.font.SysFont("Arial", 20, bold=True)
+        if self._chrome is None:
+            self._chrome = self._build_chrome()
+        dialog = self._chrome.copy()
+
+        # Dibujar la imagen centrada dentro del diálogo dejando padding y espacio para el texto inferior
+        if self.image:
+            img_rect = self.image.get_rect()
+            img_x = (self.dialog_w - img_rect.width) // 2
+            img_y = self.padding
+            dialog.blit(self.image, (img_x, img_y))
+
+        # Dibujar iconos decorativos en las esquinas del diálogo
+        if self._icons:
+            # tamaño pequeño para esquinas
+            icon_margin = 8
+            # top-left
+            dialog.blit(self._icons[0], (icon_margin, icon_margin))
+            # top-right
+            ir = self._icons[1].get_rect()
+            dialog.blit(self._icons[1], (self.dialog_w - ir.width - icon_margin, icon_margin))
+            # bottom-left
+            ib = self._icons[2].get_rect()
+            dialog.blit(self._icons[2], (icon_margin, self.dialog_h - ib.height - icon_margin))
+            # bottom-right
+            ir2 = self._icons[3].get_rect()
+            dialog.blit(self._icons[3], (self.dialog_w - ir2.width - icon_margin, self.dialog_h - ir2.height - icon_margin))
+
+        # Texto de instrucción dentro del diálogo
+        text = "Presiona X para continuar"
+        text_surf = self._font.render(text, True, (30, 30, 30))
+        text_rect = text_surf.get_rect()
+        text_x = (self.dialog_w - text_rect.width) // 2
+        text_y = self.dialog_h - self.padding - text_rect.height
+        dialog.blit(text_surf, (text_x, text_y))
+        return dialog
 
     def _get_icon(self, x, y, width, height):
         """Extrae y escala un icono pequeño desde el sprite sheet `item_objects`."""
@@ -64,14 +144,8 @@ class PopupText:
         if sprite_sheet is None:
             raise RuntimeError('No se encontró item_objects en GFX')
 
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-        image.blit(sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-        image = pg.transform.scale(image,
-                                   (int(rect.width * c.SIZE_MULTIPLIER),
-                                    int(rect.height * c.SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(sprite_sheet, x, y, width, height,
+                               c.SIZE_MULTIPLIER)
 
     def _draw_decorative_frame(self, dialog):
         """Dibuja líneas y acentos dentro del diálogo para un marco con estilo del juego.
@@ -124,6 +198,12 @@ class PopupText:
 
     def hide(self):
         self.active = False
+        self.prefetch()
+
+    def update(self):
+        """Avanza la animación de entrada un paso de simulación."""
+        if self.active and self._anim_progress < 1.0:
+            self._anim_progress = min(1.0, self._anim_progress + self._anim_speed)
 
     def draw(self, surface):
         if not self.active:
@@ -131,14 +211,11 @@ class PopupText:
 
         sw, sh = surface.get_size()
 
-        # Fondo de atenuación (más ligero que antes)
-        overlay = pg.Surface((sw, sh), pg.SRCALPHA)
-        overlay.fill((0, 0, 0, 120))
-        surface.blit(overlay, (0, 0))
-
-        # Actualizar animación
-        if self._anim_progress < 1.0:
-            self._anim_progress = min(1.0, self._anim_progress + self._anim_speed)
+        # Fondo de atenuación (más ligero que antes), creado una sola vez
+        if self._overlay is None or self._overlay.get_size() != (sw, sh):
+            self._overlay = pg.Surface((sw, sh), pg.SRCALPHA)
+            self._overlay.fill((0, 0, 0, 120))
+        surface.blit(self._overlay, (0, 0))
 
         # Posición final del diálogo (centrado)
         target_x = (sw - self.dialog_w) // 2
@@ -151,55 +228,13 @@ class PopupText:
         ease = 1 - (1 - t) * (1 - t)
         cur_y = int(start_y + (target_y - start_y) * ease)
 
-        # Diálogo como superficie con alpha
-        dialog = pg.Surface((self.dialog_w, self.dialog_h), pg.SRCALPHA)
-        # Fondo del cuadro
-        bg_color = (245, 245, 245, 255)
-        pg.draw.rect(dialog, bg_color, (0, 0, self.dialog_w, self.dialog_h), border_radius=self.border_radius)
-        # Borde
-        border_color = (50, 50, 60)
-        pg.draw.rect(dialog, border_color, (0, 0, self.dialog_w, self.dialog_h), width=3, border_radius=self.border_radius)
-
-        # Marco decorativo adicional (líneas/acento estilo juego)
-        self._draw_decorative_frame(dialog)
-
-        # Dibujar la imagen centrada dentro del diálogo dejando padding y espacio para el texto inferior
-        if self.image:
-            img_rect = self.image.get_rect()
-            img_x = (self.dialog_w - img_rect.width) // 2
-            img_y = self.padding
-            dialog.blit(self.image, (img_x, img_y))
-
-        # Dibujar iconos decorativos en las esquinas del diálogo
-        if self._icons:
-            # tamaño pequeño para esquinas
-            icon_margin = 8
-            # top-left
-            dialog.blit(self._icons[0], (icon_margin, icon_margin))
-            # top-right
-            ir = self._icons[1].get_rect()
-            dialog.blit(self._icons[1], (self.dialog_w - ir.width - icon_margin, icon_margin))
-            # bottom-left
-            ib = self._icons[2].get_rect()
-            dialog.blit(self._icons[2], (icon_margin, self.dialog_h - ib.height - icon_margin))
-            # bottom-right
-            ir2 = self._icons[3].get_rect()
-            dialog.blit(self._icons[3], (self.dialog_w - ir2.width - icon_margin, self.dialog_h - ir2.height - icon_margin))
-
-        # Texto de instrucción dentro del diálogo
-        text = "Presiona X para continuar"
-        text_surf = self._font.render(text, True, (30, 30, 30))
-        text_rect = text_surf.get_rect()
-        text_x = (self.dialog_w - text_rect.width) // 2
-        text_y = self.dialog_h - self.padding - text_rect.height
-        dialog.blit(text_surf, (text_x, text_y))
+        if self._dialog_surf is None:
+            self._dialog_surf = self._build_dialog()
 
-        # Aplicar fade según animación
-        alpha = int(255 * self._anim_progress)
-        if alpha < 255:
-            dialog.set_alpha(alpha)
+        # Aplicar fade según animación; al terminar queda opaco
+        self._dialog_surf.set_alpha(int(255 * self._anim_progress))
 
         # Blit al surface principal
-        surface.blit(dialog, (target_x, cur_y))
+        surface.blit(self._dialog_surf, (target_x, cur_y))
 
         # Nota: cuando la animación haya terminado, la caja permanece hasta hide() sea llamada.
@@ -2,7 +2,7 @@ __author__ = 'justinarmstrong'
 
 import pygame as pg
 from .. import constants as c
-from .. import setup
+from .. import setup, tools
 
 
 class Powerup(pg.sprite.Sprite):
@@ -35,18 +35,8 @@ class Powerup(pg.sprite.Sprite):
 
     def get_image(self, x, y, width, height):
         """Get the image frames from the sprite sheet"""
-
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-
-
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.SIZE_MULTIPLIER)
 
 
     def update(self, game_info, *args):
@@ -282,18 +272,8 @@ class FireBall(pg.sprite.Sprite):
 
     def get_image(self, x, y, width, height):
         """Get the image frames from the sprite sheet"""
-
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-
-
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.SIZE_MULTIPLIER)
 
 
     def update(self, game_info, viewport):
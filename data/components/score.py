@@ -1,7 +1,7 @@
 __author__ = 'justinarmstrong'
 
 import pygame as pg
-from .. import setup
+from .. import setup, tools
 from .. import constants as c
 
 
@@ -56,15 +56,8 @@ class Score(object):
 
     def get_image(self, x, y, width, height):
         """Extracts image from sprite sheet"""
-        image = pg.Surface([width, height]).convert()
-        rect = image.get_rect()
-
-        image.blit(self.sprite_sheet, (0, 0), (x, y, width, height))
-        image.set_colorkey(c.BLACK)
-        image = pg.transform.scale(image,
-                                   (int(rect.width*c.BRICK_SIZE_MULTIPLIER),
-                                    int(rect.height*c.BRICK_SIZE_MULTIPLIER)))
-        return image
+        return tools.get_image(self.sprite_sheet, x, y, width, height,
+                               c.BRICK_SIZE_MULTIPLIER)
 
 
     def create_digit_list(self):
@@ -99,10 +92,10 @@ class Score(object):
                 self.y_vel = 0
 
 
-    def draw(self, screen):
-        """Draws score numbers onto screen"""
+    def draw(self, screen, offset=(0, 0)):
+        """Draws score numbers onto screen, moved by offset"""
         for digit in self.digit_list:
-            screen.blit(digit.image, digit.rect)
+            screen.blit(digit.image, digit.rect.move(offset))
 
 
     def check_to_delete_floating_scores(self, score_list, level_info):
@@ -7,6 +7,18 @@ SCREEN_SIZE = (SCREEN_WIDTH,SCREEN_HEIGHT)
 
 ORIGINAL_CAPTION = "Juegos Serios - Introducción a la Gamificación"
 
+## GAME LOOP ##
+
+SIMULATION_FPS = 60
+MAX_SIMULATION_STEPS = 5
+MAX_RENDER_FPS = 144
+MAX_INTERPOLATION_DISTANCE = 64
+
+# Bricks, coin boxes and the flag sleep while they are at rest further than
+# this from the screen, in pixels (None keeps every sprite awake).  Keep it
+# well above how far the camera moves in one frame
+ACTIVE_MARGIN = 400
+
 ## COLORS ##
 
 #            R    G    B
@@ -32,6 +44,11 @@ BGCOLOR = WHITE
 SIZE_MULTIPLIER = 2.5
 BRICK_SIZE_MULTIPLIER = 2.69
 BACKGROUND_MULTIPLER = 2.679
+# The scaled background is made in chunks this many pixels wide, when the
+# camera gets within a chunk of them, and at most BACKGROUND_CHUNKS are kept
+BACKGROUND_CHUNK_WIDTH = SCREEN_WIDTH
+BACKGROUND_CHUNKS = 4
+
 GROUND_HEIGHT = SCREEN_HEIGHT - 62
 
 #MARIO FORCES
@@ -179,15 +196,17 @@ DIAPOSITIVAS = [
     "data/diapositivas/2.jpg",
     "data/diapositivas/3.jpg",
     "data/diapositivas/4.jpg",
-    "data/diapositivas/8.png",
-    "data/diapositivas/9.png",
-    "data/diapositivas/10.png",
-    "data/diapositivas/11.png",
-    "data/diapositivas/12.png",
-    "data/diapositivas/13.png",
-    "data/diapositivas/14.png",
-    "data/diapositivas/15.png",
+    "data/diapositivas/8.jpg",
+    "data/diapositivas/9.jpg",
+    "data/diapositivas/10.jpg",
+    "data/diapositivas/11.jpg",
+    "data/diapositivas/12.jpg",
 ]
 
+# Slides loaded in the background ahead of DIAPOSITIVA_INDEX, and how many
+# loaded slides are kept
+SLIDE_PREFETCH = 3
+SLIDE_CACHE_SIZE = SLIDE_PREFETCH + 1
+
 
 
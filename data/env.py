@@ -0,0 +1,202 @@
+"""
+Gym style environment around Level1 for automated play.
+
+    env = LevelEnv(frame_skip=4)
+    observation = env.reset()
+    observation, reward, done, info = env.step(action)
+
+Steps call Control.update directly, so nothing waits on clock.tick and
+game time advances by one fixed step per frame.  Unless SDL drivers were
+chosen already, importing this module selects the dummy video and audio
+drivers so it runs without a window.
+"""
+
+import os
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame as pg
+from . import setup, tools
+from . import constants as c
+from .states import level1
+
+# Every action is a combination of tools.keybinding names
+ACTIONS = [(),
+           ('right',),
+           ('right', 'jump'),
+           ('right', 'action'),
+           ('right', 'action', 'jump'),
+           ('jump',),
+           ('left',),
+           ('left', 'jump'),
+           ('left', 'action'),
+           ('left', 'action', 'jump'),
+           ('down',),
+           ('action',)]
+
+ENEMIES_OBSERVED = 4
+OBSERVATION_SIZE = 9 + 2 * ENEMIES_OBSERVED
+
+DISMISS = 'dismiss'
+INJECT = 'inject'
+
+
+def new_game_info():
+    """game_info for a new game, the same values the main menu starts with"""
+    return {c.COIN_TOTAL: 0,
+            c.SCORE: 0,
+            c.LIVES: 3,
+            c.TOP_SCORE: 0,
+            c.CURRENT_TIME: 0.0,
+            c.LEVEL_STATE: None,
+            c.CAMERA_START_X: 0,
+            c.MARIO_DEAD: False}
+
+
+class ActionKeys(object):
+    """Stands in for pg.key.get_pressed() with a fixed set of keys down"""
+    def __init__(self, pressed):
+        self.pressed = frozenset(pressed)
+
+    def __getitem__(self, key):
+        return key in self.pressed
+
+
+class LevelEnv(object):
+    """Runs level 1 one action at a time.  Each action is held for
+    frame_skip frames and the rewards of those frames are added up.
+
+    Slides requested by coin boxes are handled according to popups:
+    'dismiss' clears them before they are loaded, 'inject' lets them open
+    and presses X to close them, like a player would."""
+    def __init__(self, frame_skip=4, max_steps=None, popups=DISMISS,
+                 x_reward=0.1, score_reward=0.01, death_reward=-50.0,
+                 flag_reward=100.0):
+        self.frame_skip = frame_skip
+        self.max_steps = max_steps
+        self.popups = popups
+        self.x_reward = x_reward
+        self.score_reward = score_reward
+        self.death_reward = death_reward
+        self.flag_reward = flag_reward
+        self.actions = ACTIONS
+        self.action_keys = []
+        self.popup_keys = []
+        for action in ACTIONS:
+            keys = [tools.keybinding[name] for name in action]
+            self.action_keys.append(ActionKeys(keys))
+            self.popup_keys.append(ActionKeys(keys + [pg.K_x]))
+
+        self.control = tools.Control(setup.ORIGINAL_CAPTION, headless=True)
+        self.control.fps = 0
+        self.level = level1.Level1()
+        self.control.setup_states({c.LEVEL1: self.level}, c.LEVEL1,
+                                  new_game_info())
+        self.start = self.level.snapshot()
+        self.start_time = self.control.current_time
+        self.steps = 0
+        self.done = True
+
+    @property
+    def action_count(self):
+        return len(self.actions)
+
+    def reset(self):
+        """Puts the level back to its start and returns the first
+        observation"""
+        self.control.restore_keyframe(0, c.LEVEL1, self.start_time, self.start)
+        self.steps = 0
+        self.done = False
+        self.last_x = self.level.mario.rect.x
+        self.last_score = self.level.game_info[c.SCORE]
+        return self.observation()
+
+    def step(self, action):
+        """Holds an action for frame_skip frames.  Returns (observation,
+        reward, done, info)"""
+        if self.done:
+            raise RuntimeError('step() called on a finished episode, '
+                               'call reset() first')
+        level = self.level
+        mario = level.mario
+        reward = 0.0
+        dead = False
+        flag = False
+        for i in range(self.frame_skip):
+            self.control.keys = self.action_keys[action]
+            if c.POPUP_ACTIVE:
+                self.handle_popup(action)
+            self.control.update()
+
+            mario = level.mario
+            reward += self.x_reward * (mario.rect.x - self.last_x)
+            reward += self.score_reward * (level.game_info[c.SCORE] - self.last_score)
+            self.last_x = mario.rect.x
+            self.last_score = level.game_info[c.SCORE]
+
+            dead = mario.dead
+            flag = mario.state in (c.FLAGPOLE, c.WALKING_TO_CASTLE,
+                                   c.END_OF_LEVEL_FALL) or mario.in_castle
+            if dead:
+                reward += self.death_reward
+            elif flag:
+                reward += self.flag_reward
+            if dead or flag or level.done:
+                self.done = True
+                break
+
+        self.steps += 1
+        if self.max_steps and self.steps >= self.max_steps:
+            self.done = True
+        info = {'x': mario.rect.x,
+                'score': level.game_info[c.SCORE],
+                'dead': dead,
+                'flag': flag,
+                'frame': self.control.frame}
+        return self.observation(), reward, self.done, info
+
+    def handle_popup(self, action):
+        """Gets a requested slide out of the way for the coming frame"""
+        if self.popups == INJECT:
+            self.control.keys = self.popup_keys[action]
+        else:
+            c.POPUP_ACTIVE = False
+            c.REQUEST_POPUP_TEXT = None
+            c.DIAPOSITIVA_INDEX += 1
+
+    def observation(self):
+        """Tuple of OBSERVATION_SIZE floats: Mario's position, velocity and
+        power ups, the camera, the time left and the offset of the
+        ENEMIES_OBSERVED enemies closest to Mario"""
+        level = self.level
+        mario = level.mario
+        values = [mario.rect.x, mario.rect.y, mario.x_vel, mario.y_vel,
+                  mario.big, mario.fire, mario.invincible,
+                  level.viewport.x, level.overhead_info_display.time]
+
+        enemies = []
+        for group in (level.enemy_group, level.shell_group):
+            for enemy in group:
+                enemies.append((abs(enemy.rect.x - mario.rect.x),
+                                enemy.rect.x - mario.rect.x,
+                                enemy.rect.y - mario.rect.y))
+        enemies.sort()
+        for i in range(ENEMIES_OBSERVED):
+            if i < len(enemies):
+                values.extend(enemies[i][1:])
+            else:
+                values.extend((0, 0))
+        return tuple(float(value) for value in values)
+
+    def render(self, mode='rgb_array'):
+        """Draws the level.  'rgb_array' returns a height x width x 3
+        array (needs NumPy), 'surface' returns the screen surface and
+        'human' updates the display"""
+        self.control.draw(1.0)
+        surface = self.control.screen
+        if mode == 'human':
+            pg.display.update()
+        elif mode == 'surface':
+            return surface
+        else:
+            return pg.surfarray.array3d(surface).swapaxes(0, 1)
@@ -0,0 +1,150 @@
+"""
+Level descriptions, one JSON file per level in this directory:
+
+    {"background": "level_1",
+     "ground": [[x, y, width, height], ...],
+     "pipes": [[x, y, width, height], ...],
+     "steps": [[x, y, width, height], ...],
+     "bricks": [{"x": x, "y": y, "contents": "6coins" or "star"}, ...],
+     "coin_boxes": [{"x": x, "y": y, "contents": "coin", "slide": true}, ...],
+     "flag_pole": {"flag": [x, y], "finial": [x, y], "poles": [[x, y], ...],
+                   "score_x": x},
+     "checkpoints": [{"name": name, "x": x, "y": y, "width": w, "height": h,
+                      "enemies": [{"kind": "goomba", "y": bottom}, ...]}, ...]}
+
+background is the GFX image drawn behind the level.  Ground, pipes and
+steps are invisible colliders.  contents, y, width, height, enemies and an
+enemy's y are optional; coin box contents are "coin", "mushroom" or
+"fireflower", and a box with "slide": false doesn't open the next slide
+when bumped.  Touching a checkpoint sends its enemies in from the right
+edge of the screen.  score_x is where the points for touching the flag
+pole rise from.  The checkpoints named "flag_pole", "castle" and
+"secret_mushroom" start the end of the level, Mario entering the castle and
+the hidden 1up box.
+
+load parses and checks a file once per process, or again when it
+changes.  Checkpoints come back sorted by x so the level can find the one
+Mario touches by bisecting.
+"""
+
+import json
+import os
+from .. import constants as c
+
+LEVEL_DIRECTORY = os.path.dirname(os.path.abspath(__file__))
+
+BRICK_CONTENTS = (None, c.SIXCOINS, c.STAR)
+BOX_CONTENTS = (c.COIN, c.MUSHROOM, c.FIREFLOWER)
+ENEMY_KINDS = (c.GOOMBA, c.KOOPA)
+
+_levels = {}
+
+
+class LevelData(object):
+    """A parsed level file.  Every list holds tuples:
+
+    ground, pipes, steps   (x, y, width, height)
+    bricks                 (x, y, contents)
+    coin_boxes             (x, y, contents, slide)
+    flag, finial           (x, y), and poles a list of them
+    flag_score_x           x
+    checkpoints            (x, name, y, width, height, enemies), sorted by
+                           x, with enemies a tuple of (kind, y)"""
+    def __init__(self, path, data):
+        self.path = path
+        self.background = self.field(data, 'background', str)
+        self.ground = [self.rect(item) for item in self.field(data, 'ground', list)]
+        self.pipes = [self.rect(item) for item in self.field(data, 'pipes', list)]
+        self.steps = [self.rect(item) for item in self.field(data, 'steps', list)]
+        self.bricks = [self.brick(item) for item in self.field(data, 'bricks', list)]
+        self.coin_boxes = [self.coin_box(item)
+                           for item in self.field(data, 'coin_boxes', list)]
+
+        flag_pole = self.field(data, 'flag_pole', dict)
+        self.flag = self.point(self.field(flag_pole, 'flag', list))
+        self.finial = self.point(self.field(flag_pole, 'finial', list))
+        self.poles = [self.point(item)
+                      for item in self.field(flag_pole, 'poles', list)]
+        self.flag_score_x = self.field(flag_pole, 'score_x', int)
+
+        checkpoints = [self.checkpoint(item)
+                       for item in self.field(data, 'checkpoints', list)]
+        names = [checkpoint[1] for checkpoint in checkpoints]
+        if len(set(names)) != len(names):
+            self.error('checkpoint names must be unique')
+        self.checkpoints = sorted(checkpoints, key=lambda checkpoint: checkpoint[0])
+
+    def error(self, message):
+        raise ValueError('{}: {}'.format(self.path, message))
+
+    def field(self, data, name, kind, default=None):
+        if not isinstance(data, dict):
+            self.error('expected an object, got {!r}'.format(data))
+        value = data.get(name, default)
+        if value is None and default is None:
+            self.error('missing "{}"'.format(name))
+        if kind is int and isinstance(value, bool) or not isinstance(value, kind):
+            self.error('"{}" should be {}, got {!r}'.format(
+                name, kind.__name__, value))
+        return value
+
+    def numbers(self, item, count):
+        if not isinstance(item, list) or len(item) != count or \
+                not all(isinstance(n, int) and not isinstance(n, bool)
+                        for n in item):
+            self.error('expected {} integers, got {!r}'.format(count, item))
+        return tuple(item)
+
+    def rect(self, item):
+        return self.numbers(item, 4)
+
+    def point(self, item):
+        return self.numbers(item, 2)
+
+    def choice(self, value, choices, what):
+        if value not in choices:
+            self.error('unknown {} {!r}'.format(what, value))
+        return value
+
+    def brick(self, item):
+        contents = item.get('contents') if isinstance(item, dict) else None
+        return (self.field(item, 'x', int), self.field(item, 'y', int),
+                self.choice(contents, BRICK_CONTENTS, 'brick contents'))
+
+    def coin_box(self, item):
+        return (self.field(item, 'x', int), self.field(item, 'y', int),
+                self.choice(self.field(item, 'contents', str), BOX_CONTENTS,
+                            'coin box contents'),
+                self.field(item, 'slide', bool, True))
+
+    def enemy(self, item):
+        return (self.choice(self.field(item, 'kind', str), ENEMY_KINDS,
+                            'enemy kind'),
+                self.field(item, 'y', int, c.GROUND_HEIGHT))
+
+    def checkpoint(self, item):
+        enemies = self.field(item, 'enemies', list, [])
+        return (self.field(item, 'x', int), self.field(item, 'name', str),
+                self.field(item, 'y', int, 0), self.field(item, 'width', int, 10),
+                self.field(item, 'height', int, 600),
+                tuple(self.enemy(enemy) for enemy in enemies))
+
+
+def level_path(name):
+    return os.path.join(LEVEL_DIRECTORY, name + '.json')
+
+
+def load(name):
+    """The LevelData of data/levels/<name>.json, shared by every caller"""
+    path = level_path(name)
+    mtime = os.stat(path).st_mtime
+    cached = _levels.get(path)
+    if cached is None or cached[0] != mtime:
+        with open(path) as level_file:
+            try:
+                data = json.load(level_file)
+            except ValueError as error:
+                raise ValueError('{}: {}'.format(path, error))
+        cached = (mtime, LevelData(path, data))
+        _levels[path] = cached
+    return cached[1]
@@ -1,21 +1,67 @@
 __author__ = 'justinarmstrong'
 
 from . import setup,tools
+from . import replay as replay_file
+from . import profiling
 from .states import main_menu,load_screen,level1
+from .components import popup_text
 from . import constants as c
 
 
-def main():
+def main(start_state=c.MAIN_MENU, headless=False, fps=None, max_frames=None,
+         simulated_clock=False, record=None, replay=None, seek=None,
+         keyframe_seconds=5, profile=None, warm_up=False,
+         active_margin=c.ACTIVE_MARGIN, checksum=False):
     """Add states to control here."""
-    run_it = tools.Control(setup.ORIGINAL_CAPTION)
+    setup.load_pack(popup_text.slide_area())
+    if warm_up:
+        setup.warm_up()
+        popup_text.SLIDES.ahead = c.SLIDE_PREFETCH
+    run_it = tools.Control(setup.ORIGINAL_CAPTION, headless)
+    if fps is not None:
+        run_it.fps = fps
+    elif headless:
+        run_it.fps = 0
+
+    if replay:
+        run_it.player = replay_file.ReplayPlayer(replay)
+        run_it.step_time = run_it.player.step_time
+        run_it.game_clock.step_time = run_it.player.step_time
+        start_state = run_it.player.start_state
+        if max_frames is None:
+            max_frames = run_it.player.frames
+    if simulated_clock or record or replay:
+        run_it.game_clock.simulated = True
+    run_it.max_frames = max_frames
+    if profile:
+        run_it.timer = profiling.PhaseTimer()
+        run_it.profile_path = profile
+
     state_dict = {c.MAIN_MENU: main_menu.Menu(),
                   c.LOAD_SCREEN: load_screen.LoadScreen(),
                   c.TIME_OUT: load_screen.TimeOut(),
                   c.GAME_OVER: load_screen.GameOver(),
                   c.LEVEL1: level1.Level1()}
+    state_dict[c.LEVEL1].active_margin = active_margin
+    if checksum:
+        state_dict[c.LEVEL1].checksum = 0
 
-    run_it.setup_states(state_dict, c.MAIN_MENU)
-    run_it.main()
-
+    persist = None
+    if start_state != c.MAIN_MENU:
+        persist = state_dict[c.MAIN_MENU].persist
 
+    run_it.setup_states(state_dict, start_state, persist)
+    if record:
+        run_it.recorder = replay_file.ReplayRecorder(
+            record, start_state, run_it.step_time, keyframe_seconds)
+    if seek and run_it.player:
+        run_it.player.seek(run_it, seek)
 
+    try:
+        run_it.main()
+    finally:
+        if run_it.recorder:
+            run_it.recorder.close()
+        if run_it.profile_path:
+            run_it.timer.export(run_it.profile_path)
+    return run_it
@@ -0,0 +1,122 @@
+"""
+Per-phase frame timing.
+
+Control and the states mark the end of each phase of a frame with
+timer.add(phase, start), which returns the current time so the next phase
+can start from it.  Durations go into fixed-size histograms with
+logarithmic buckets, so memory use doesn't grow with the length of the
+run.  By default the timer is a NullTimer, which does nothing.
+"""
+
+import csv
+import json
+import math
+import time
+
+BUCKETS = 256
+GROWTH = 1.06     # each bucket is 6% wider than the one before it
+SMALLEST = 1e-6   # upper edge of the first bucket, in seconds
+SCALE = 1.0 / math.log(GROWTH)
+
+FIELDS = ('phase', 'count', 'mean_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms')
+
+
+class Histogram(object):
+    """Counts durations in BUCKETS logarithmic buckets"""
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, duration):
+        if duration > SMALLEST:
+            bucket = min(int(math.log(duration / SMALLEST) * SCALE) + 1,
+                         BUCKETS - 1)
+        else:
+            bucket = 0
+        self.counts[bucket] += 1
+        self.count += 1
+        self.total += duration
+        if duration > self.max:
+            self.max = duration
+
+    def percentile(self, percent):
+        """Upper edge of the bucket holding the given percentile, in
+        seconds"""
+        if not self.count:
+            return 0.0
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for bucket, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                return min(SMALLEST * GROWTH ** bucket, self.max)
+        return self.max
+
+
+class PhaseTimer(object):
+    """Collects a histogram of durations for every phase name"""
+    enabled = True
+
+    def __init__(self):
+        self.histograms = {}
+        self.now = time.perf_counter
+
+    def add(self, phase, start):
+        """Records the time since start for a phase and returns the
+        current time"""
+        end = self.now()
+        histogram = self.histograms.get(phase)
+        if histogram is None:
+            histogram = self.histograms[phase] = Histogram()
+        histogram.add(end - start)
+        return end
+
+    def summary(self):
+        """One row per phase, in the order the phases were first seen"""
+        rows = []
+        for phase, histogram in self.histograms.items():
+            rows.append({'phase': phase,
+                         'count': histogram.count,
+                         'mean_ms': 1000.0 * histogram.total / histogram.count,
+                         'p50_ms': 1000.0 * histogram.percentile(50),
+                         'p95_ms': 1000.0 * histogram.percentile(95),
+                         'p99_ms': 1000.0 * histogram.percentile(99),
+                         'max_ms': 1000.0 * histogram.max})
+        return rows
+
+    def export(self, path):
+        """Writes the summary to a .json file, or a CSV file for any other
+        extension"""
+        rows = self.summary()
+        with open(path, 'w') as output:
+            if path.lower().endswith('.json'):
+                json.dump({'phases': rows}, output, indent=2)
+            else:
+                writer = csv.DictWriter(output, FIELDS)
+                writer.writeheader()
+                for row in rows:
+                    for field in FIELDS[2:]:
+                        row[field] = round(row[field], 4)
+                    writer.writerow(row)
+
+
+class NullTimer(object):
+    """Timer used when profiling is off"""
+    enabled = False
+
+    def now(self):
+        return 0.0
+
+    def add(self, phase, start):
+        return 0.0
+
+    def summary(self):
+        return []
+
+    def export(self, path):
+        pass
+
+
+NULL_TIMER = NullTimer()
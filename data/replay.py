@@ -0,0 +1,261 @@
+"""
+Recording and playback of the per-frame keyboard state.
+
+A replay file starts with a header, followed by blocks of input covering
+keyframe_interval frames each.  A block may be preceded by a keyframe,
+the full state snapshot taken right before the block's first frame.  An
+index at the end of the file maps block start frames to file offsets, so
+playback can jump to the keyframe closest to any frame and only simulate
+the few frames after it.
+
+Each frame's keys are packed into a bit mask, one bit per key returned by
+replay_keys().  Blocks store runs of identical masks as a varint of the
+mask XORed with the previous run's mask, followed by a varint run length.
+"""
+
+import bisect
+import struct
+import pygame as pg
+from . import tools
+
+MAGIC = b'MRPL'
+INDEX_MAGIC = b'MRPI'
+VERSION = 1
+
+BLOCK = b'B'
+KEYFRAME = b'K'
+INDEX = b'I'
+
+HEADER = struct.Struct('<4sHdIB')
+BLOCK_HEADER = struct.Struct('<II')
+KEYFRAME_HEADER = struct.Struct('<IdBI')
+INDEX_ENTRY = struct.Struct('<IQQ')
+FOOTER = struct.Struct('<QII4s')
+
+
+def replay_keys():
+    """Keys worth recording: the keybinding keys, X for the slides and the
+    main menu keys"""
+    keys = list(tools.keybinding.values())
+    keys += [pg.K_x, pg.K_RETURN, pg.K_a, pg.K_s, pg.K_UP, pg.K_DOWN]
+    unique = []
+    for key in keys:
+        if key not in unique:
+            unique.append(key)
+    return unique
+
+
+def write_varint(buf, value):
+    """Appends an unsigned LEB128 integer to a bytearray"""
+    while value >= 0x80:
+        buf.append((value & 0x7f) | 0x80)
+        value >>= 7
+    buf.append(value)
+
+
+def read_varint(data, offset):
+    """Reads an unsigned LEB128 integer, returning (value, new offset)"""
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class ReplayKeys(object):
+    """Stands in for pg.key.get_pressed() during playback"""
+    def __init__(self, mask, bits):
+        self.mask = mask
+        self.bits = bits
+
+    def __getitem__(self, key):
+        bit = self.bits.get(key)
+        if bit is None:
+            return False
+        return bool(self.mask & bit)
+
+
+class ReplayRecorder(object):
+    """Writes the keys used by every simulation step to a replay file"""
+    def __init__(self, path, start_state, step_time, keyframe_seconds=5):
+        self.keys = replay_keys()
+        self.interval = max(1, int(round(keyframe_seconds * 1000.0 / step_time)))
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(MAGIC, VERSION, step_time,
+                                    self.interval, len(self.keys)))
+        self.file.write(struct.pack('<%dI' % len(self.keys), *self.keys))
+        name = start_state.encode('utf-8')
+        self.file.write(struct.pack('<B', len(name)) + name)
+
+        self.index = []
+        self.frames = 0
+        self.block_start = 0
+        self.runs = bytearray()
+        self.run_count = 0
+        self.mask = 0
+        self.run_mask = 0
+        self.run_length = 0
+
+    def pack(self, keys):
+        """Bit-packs a key state"""
+        mask = 0
+        for bit, key in enumerate(self.keys):
+            if keys[key]:
+                mask |= 1 << bit
+        return mask
+
+    def record(self, control):
+        """Called by Control right before each simulation step"""
+        frame = control.frame
+        if frame % self.interval == 0:
+            if frame:
+                self.flush_block()
+            self.start_block(frame, control)
+
+        mask = self.pack(control.keys)
+        if self.run_length and mask == self.run_mask:
+            self.run_length += 1
+        else:
+            self.end_run()
+            self.run_mask = mask
+            self.run_length = 1
+        self.frames = frame + 1
+
+    def start_block(self, frame, control):
+        """Writes a keyframe if the current state can be snapshotted"""
+        self.block_start = frame
+        keyframe_offset = 0
+        blob = control.state.snapshot()
+        if blob is not None:
+            keyframe_offset = self.file.tell()
+            name = control.state_name.encode('utf-8')
+            self.file.write(KEYFRAME)
+            self.file.write(KEYFRAME_HEADER.pack(frame, control.current_time,
+                                                 len(name), len(blob)))
+            self.file.write(name)
+            self.file.write(blob)
+        self.index.append([frame, 0, keyframe_offset])
+
+    def end_run(self):
+        """Appends the current run to the block being built"""
+        if self.run_length:
+            write_varint(self.runs, self.run_mask ^ self.mask)
+            write_varint(self.runs, self.run_length)
+            self.mask = self.run_mask
+            self.run_count += 1
+            self.run_length = 0
+
+    def flush_block(self):
+        """Writes out the input runs of the current block"""
+        self.end_run()
+        self.index[-1][1] = self.file.tell()
+        self.file.write(BLOCK)
+        self.file.write(BLOCK_HEADER.pack(self.run_count, len(self.runs)))
+        self.file.write(self.runs)
+        self.runs = bytearray()
+        self.run_count = 0
+        self.mask = 0
+
+    def close(self):
+        """Finishes the last block and writes the seek index"""
+        if self.file.closed:
+            return
+        if self.index:
+            self.flush_block()
+        index_offset = self.file.tell()
+        self.file.write(INDEX)
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.write(FOOTER.pack(index_offset, len(self.index),
+                                    self.frames, INDEX_MAGIC))
+        self.file.close()
+
+
+class ReplayPlayer(object):
+    """Reads a replay file and feeds its keys back to Control"""
+    def __init__(self, path):
+        with open(path, 'rb') as replay_file:
+            self.data = replay_file.read()
+
+        magic, version, self.step_time, self.interval, count = \
+            HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError('{} is not a version {} replay'.format(path, VERSION))
+        offset = HEADER.size
+        self.keys = struct.unpack_from('<%dI' % count, self.data, offset)
+        offset += 4 * count
+        length = self.data[offset]
+        self.start_state = self.data[offset + 1:offset + 1 + length].decode('utf-8')
+        self.bits = dict((key, 1 << bit) for bit, key in enumerate(self.keys))
+
+        index_offset, entries, self.frames, magic = \
+            FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != INDEX_MAGIC:
+            raise ValueError('{} has no seek index'.format(path))
+        self.index = [INDEX_ENTRY.unpack_from(self.data, index_offset + 1 + i * INDEX_ENTRY.size)
+                      for i in range(entries)]
+        self.block_starts = [entry[0] for entry in self.index]
+        self.block = None
+        self.block_number = None
+
+    def load_block(self, number):
+        """Expands a block's runs into (last frame, mask) pairs"""
+        start, offset, keyframe_offset = self.index[number]
+        runs, size = BLOCK_HEADER.unpack_from(self.data, offset + 1)
+        position = offset + 1 + BLOCK_HEADER.size
+        ends = []
+        masks = []
+        mask = 0
+        frame = start
+        for i in range(runs):
+            delta, position = read_varint(self.data, position)
+            length, position = read_varint(self.data, position)
+            mask ^= delta
+            frame += length
+            ends.append(frame)
+            masks.append(mask)
+        self.block = (ends, masks)
+        self.block_number = number
+
+    def keys_at(self, frame):
+        """Key state used by the given simulation step"""
+        number = bisect.bisect_right(self.block_starts, frame) - 1
+        if number < 0 or frame >= self.frames:
+            return ReplayKeys(0, self.bits)
+        if number != self.block_number:
+            self.load_block(number)
+        ends, masks = self.block
+        run = bisect.bisect_right(ends, frame)
+        return ReplayKeys(masks[min(run, len(masks) - 1)], self.bits)
+
+    def keyframe_before(self, frame):
+        """Returns (frame, state name, time, snapshot) for the closest
+        keyframe at or before frame, or None if there isn't one"""
+        number = bisect.bisect_right(self.block_starts, frame) - 1
+        while number >= 0:
+            offset = self.index[number][2]
+            if offset:
+                key_frame, time, name_length, size = \
+                    KEYFRAME_HEADER.unpack_from(self.data, offset + 1)
+                position = offset + 1 + KEYFRAME_HEADER.size
+                name = self.data[position:position + name_length].decode('utf-8')
+                position += name_length
+                return key_frame, name, time, self.data[position:position + size]
+            number -= 1
+        return None
+
+    def seek(self, control, frame):
+        """Restores the nearest keyframe and simulates up to frame"""
+        keyframe = self.keyframe_before(frame)
+        if keyframe is not None and (keyframe[0] > control.frame
+                                     or control.frame > frame):
+            control.restore_keyframe(*keyframe)
+        elif control.frame > frame:
+            raise ValueError('no keyframe before frame {}'.format(frame))
+
+        while control.frame < frame and not control.done:
+            control.update()
@@ -6,7 +6,7 @@ This module initializes the display and creates dictionaries of resources.
 
 import os
 import pygame as pg
-from . import tools
+from . import tools, asset_pack, background
 from .import constants as c
 
 ORIGINAL_CAPTION = c.ORIGINAL_CAPTION
@@ -20,14 +20,134 @@ SCREEN = pg.display.set_mode(c.SCREEN_SIZE)
 SCREEN_RECT = SCREEN.get_rect()
 
 
-FONTS = tools.load_all_fonts(os.path.join("resources","fonts"))
-MUSIC = tools.load_all_music(os.path.join("resources","music"))
-GFX   = tools.load_all_gfx(os.path.join("resources","graphics"))
-SFX   = tools.load_all_sfx(os.path.join("resources","sound"))
+def load_gfx(path):
+    if PACK is not None:
+        image = PACK.image(path)
+        if image is not None:
+            return image
+    return tools.load_gfx(path)
 
-# 🔇 APAGAR TODOS LOS EFECTOS
-for s in SFX.values():
-    s.set_volume(0)
+
+def load_sfx(path):
+    sound = PACK.sound(path) if PACK is not None else None
+    if sound is None:
+        sound = pg.mixer.Sound(path)
+    # 🔇 APAGAR TODOS LOS EFECTOS
+    sound.set_volume(0)
+    return sound
+
+
+# Caches built from the resources, safe to delete
+CACHE_DIRECTORY = os.path.join("resources", "cache")
+PACK_FILE = os.path.join(CACHE_DIRECTORY, "assets.pack")
+
+# What the files listed in c.DIAPOSITIVAS can be
+SLIDE_TYPES = ('.png', '.jpg', '.jpeg')
+
+# The asset pack, once load_pack has found an up to date one
+PACK = None
+
+# Assets are loaded the first time they are used, see tools.AssetRegistry
+FONTS = tools.AssetRegistry(os.path.join("resources","fonts"),
+                            ('.ttf',), tools.load_path)
+MUSIC = tools.AssetRegistry(os.path.join("resources","music"),
+                            ('.wav', '.mp3', '.ogg', '.mdi'), tools.load_path)
+GFX   = tools.AssetRegistry(os.path.join("resources","graphics"),
+                            ('.png', 'jpg', 'bmp'), load_gfx)
+SFX   = tools.AssetRegistry(os.path.join("resources","sound"),
+                            ('.wav','.mpe','.ogg','.mdi'), load_sfx)
+
+
+# Scaled backgrounds by (name, multiplier), see get_background
+BACKGROUNDS = {}
+
+
+def get_background(name='level_1', multiplier=c.BACKGROUND_MULTIPLER):
+    """Returns GFX[name] scaled by multiplier as a
+    background.ChunkedBackground, which scales it as it is drawn.  It is
+    shared by every state"""
+    key = (name, multiplier)
+    if key not in BACKGROUNDS:
+        BACKGROUNDS[key] = background.ChunkedBackground(
+            GFX[name], multiplier, c.BACKGROUND_CHUNK_WIDTH,
+            c.BACKGROUND_CHUNKS, c.BACKGROUND_CHUNK_WIDTH)
+    return BACKGROUNDS[key]
+
+
+def pack_sources():
+    """Every file the asset pack is made from, mapped to its kind"""
+    sources = {}
+    for path in GFX.paths.values():
+        sources[path] = asset_pack.IMAGE
+    for path in SFX.paths.values():
+        sources[path] = asset_pack.SOUND
+    for path in c.DIAPOSITIVAS:
+        sources[path] = asset_pack.SLIDE
+    return sources
+
+
+def check_slides():
+    """Raises ValueError naming every slide in c.DIAPOSITIVAS that isn't
+    an image file on disk"""
+    missing = [path for path in c.DIAPOSITIVAS
+               if not os.path.isfile(path) or
+               os.path.splitext(path)[1].lower() not in SLIDE_TYPES]
+    if missing:
+        raise ValueError('{} slides in constants.DIAPOSITIVAS are missing: {}'
+                         .format(len(missing), ', '.join(missing)))
+
+
+def build_pack(slide_area):
+    """Writes the asset pack, with the slides of c.DIAPOSITIVAS scaled to
+    fit slide_area.  Returns the size of the packed data"""
+    check_slides()
+    loaders = {asset_pack.IMAGE: tools.load_gfx,
+               asset_pack.SOUND: pg.mixer.Sound,
+               asset_pack.SLIDE: lambda path: tools.load_slide(path, slide_area)}
+    return asset_pack.build_pack(PACK_FILE, pack_sources(), loaders,
+                                 tuple(slide_area))
+
+
+def load_pack(slide_area):
+    """Starts reading assets from the pack, building it first if there is
+    none yet or its sources changed, so slides are never scaled while
+    playing.  A missing slide stops the game at launch"""
+    global PACK
+    check_slides()
+    pack = asset_pack.open_pack(PACK_FILE)
+    if pack is None or pack.stale(pack_sources(), tuple(slide_area)):
+        pack = None
+        build_pack(slide_area)
+        pack = asset_pack.open_pack(PACK_FILE)
+    PACK = pack
+    return PACK
+
+
+def load_slide(path, area):
+    """A slide scaled to fit area, from the pack when it was packed for the
+    same area"""
+    if PACK is not None and tuple(area) == PACK.target[2]:
+        image = PACK.image(path)
+        if image is not None:
+            return image
+    return tools.load_slide(path, area)
+
+
+def warm_up():
+    """Starts loading the graphics and sounds in the background"""
+    GFX.warm_up()
+    SFX.warm_up()
+
+
+def load_report():
+    """(seconds, kind, name) for every asset loaded so far, slowest
+    first"""
+    report = []
+    for kind, registry in (('gfx', GFX), ('sfx', SFX)):
+        for name, seconds in registry.load_times.items():
+            report.append((seconds, kind, name))
+    report.sort(reverse=True)
+    return report
 
 # 🔇 APAGAR TODA LA MÚSICA
 pg.mixer.music.set_volume(0)
@@ -0,0 +1,227 @@
+"""
+Helpers for turning sprites into plain values and back, used by
+Level1.snapshot and Level1.restore.
+
+Only simulation state is stored.  Surfaces and frame lists are never
+written out: on restore they are taken from the live sprite being
+restored into, or, for sprites that have to be recreated, from a
+prototype instance built once per class and shared by every restored
+sprite of that class.
+"""
+
+import marshal
+import struct
+import pygame as pg
+from .components import bricks, castle_flag, checkpoint, coin, coin_box
+from .components import collider, enemies, flagpole, mario, powerups, score
+
+MAGIC = b'L1SN'
+VERSION = 4
+HEADER = struct.Struct('<4sH')
+
+SKIPPED = frozenset(('_Sprite__g', 'sprite_sheet', 'mask', 'frames'))
+
+# Frame list attributes that point at one of the sprite's other lists
+ALIASES = frozenset(('right_frames', 'left_frames'))
+
+# Sprites that never change after they are created; only the groups they
+# belong to are saved
+IMMUTABLE = (collider.Collider, checkpoint.Checkpoint,
+             flagpole.Pole, flagpole.Finial)
+
+PROTOTYPES = {
+    'bricks.Brick': lambda: bricks.Brick(0, 0),
+    'bricks.BrickPiece': lambda: bricks.BrickPiece(0, 0, 0, 0),
+    'castle_flag.Flag': lambda: castle_flag.Flag(0, 0),
+    'coin.Coin': lambda: coin.Coin(0, 0, []),
+    'coin_box.Coin_box': lambda: coin_box.Coin_box(0, 0),
+    'enemies.Goomba': lambda: enemies.Goomba(),
+    'enemies.Koopa': lambda: enemies.Koopa(),
+    'flagpole.Flag': lambda: flagpole.Flag(0, 0),
+    'mario.Mario': lambda: mario.Mario(),
+    'powerups.FireBall': lambda: powerups.FireBall(0, 0, True),
+    'powerups.FireFlower': lambda: powerups.FireFlower(0, 0),
+    'powerups.LifeMushroom': lambda: powerups.LifeMushroom(0, 0),
+    'powerups.Mushroom': lambda: powerups.Mushroom(0, 0),
+    'powerups.Star': lambda: powerups.Star(0, 0),
+}
+
+_prototypes = {}
+
+
+def class_key(sprite):
+    """Name used to recreate a sprite of this class"""
+    cls = sprite.__class__
+    return '{}.{}'.format(cls.__module__.rsplit('.', 1)[-1], cls.__name__)
+
+
+def prototype(key):
+    """Returns the shared prototype sprite for a class key"""
+    if key not in _prototypes:
+        _prototypes[key] = PROTOTYPES[key]()
+    return _prototypes[key]
+
+
+def is_frame_list(value):
+    """Lists and nested lists of surfaces, which are never saved"""
+    if isinstance(value, list):
+        return True
+    return isinstance(value, tuple) and bool(value) \
+        and isinstance(value[0], (pg.Surface, list, tuple))
+
+
+def encode_score(moving_score):
+    """Floating score as (string, x, y, flag pole, y velocity, digit y)"""
+    return (moving_score.score_string, moving_score.x, moving_score.y,
+            moving_score.flag_pole_score, moving_score.y_vel,
+            moving_score.digit_list[0].rect.y)
+
+
+def decode_score(record):
+    """Recreates a floating score, sharing the digit images"""
+    if 'score.Score' not in _prototypes:
+        _prototypes['score.Score'] = score.Score(0, 0, 0)
+    base = _prototypes['score.Score']
+    score_string, x, y, flag_pole, y_vel, digit_y = record
+
+    moving_score = score.Score.__new__(score.Score)
+    moving_score.x = x
+    moving_score.y = y
+    moving_score.y_vel = y_vel
+    moving_score.sprite_sheet = base.sprite_sheet
+    moving_score.image_dict = base.image_dict
+    moving_score.score_string = score_string
+    moving_score.flag_pole_score = flag_pole
+    moving_score.create_digit_list()
+    for digit in moving_score.digit_list:
+        digit.rect.y = digit_y
+    return moving_score
+
+
+def pack(payload):
+    """Wraps a payload of plain values into a versioned blob"""
+    return HEADER.pack(MAGIC, VERSION) + marshal.dumps(payload)
+
+
+def unpack(blob):
+    """Opens a blob made by pack"""
+    magic, version = HEADER.unpack_from(blob, 0)
+    if magic != MAGIC:
+        raise ValueError('not a Level1 snapshot')
+    if version != VERSION:
+        raise ValueError('snapshot version {} is not supported (expected {})'
+                         .format(version, VERSION))
+    return marshal.loads(bytes(blob[HEADER.size:]))
+
+
+class SpriteCodec(object):
+    """Encodes sprite attributes as marshal-friendly values.  references
+    maps id() of shared objects (sprite groups, the score list, the
+    viewport) to a name, and objects maps those names back."""
+    def __init__(self, references, objects):
+        self.references = references
+        self.objects = objects
+        self.schemas = []
+        self.schema_index = {}
+
+    def frame_lists(self, sprite):
+        """Lists of surfaces held by a sprite, excluding the aliases"""
+        lists = []
+        for name in sorted(sprite.__dict__):
+            value = sprite.__dict__[name]
+            if name not in ALIASES and isinstance(value, (list, tuple)) \
+                    and value and isinstance(value[0], pg.Surface):
+                lists.append((name, value))
+        return lists
+
+    def encode_surface(self, sprite, surface, lists):
+        frames = sprite.__dict__.get('frames')
+        if frames:
+            for i, frame in enumerate(frames):
+                if frame is surface:
+                    return ('F', i)
+        for name, frame_list in lists:
+            for i, frame in enumerate(frame_list):
+                if frame is surface:
+                    return ('I', name, i)
+        return ('P',)
+
+    def encode_value(self, sprite, name, value, lists):
+        if value is None or isinstance(value, (bool, int, float, str)):
+            return value
+        if isinstance(value, pg.Rect):
+            return ('R', value.x, value.y, value.w, value.h)
+        if isinstance(value, pg.Surface):
+            return self.encode_surface(sprite, value, lists)
+        if id(value) in self.references:
+            return ('O', self.references[id(value)])
+        if is_frame_list(value):
+            if name in ALIASES:
+                for list_name, frame_list in lists:
+                    if frame_list is value:
+                        return ('L', list_name)
+            return ('P',)
+        if isinstance(value, tuple):
+            return ('T',) + tuple(self.encode_value(sprite, name, item, lists)
+                                  for item in value)
+        raise TypeError('cannot snapshot {}.{} of type {}'.format(
+            class_key(sprite), name, type(value).__name__))
+
+    def encode(self, sprite):
+        """Returns (schema number, values) for a sprite"""
+        lists = self.frame_lists(sprite) if 'right_frames' in sprite.__dict__ else ()
+        names = []
+        values = []
+        for name, value in sprite.__dict__.items():
+            if name in SKIPPED:
+                continue
+            encoded = self.encode_value(sprite, name, value, lists)
+            if encoded == ('P',) and is_frame_list(value):
+                continue
+            names.append(name)
+            values.append(encoded)
+
+        names = tuple(names)
+        if names not in self.schema_index:
+            self.schema_index[names] = len(self.schemas)
+            self.schemas.append(names)
+        return self.schema_index[names], tuple(values)
+
+    def decode_value(self, sprite, name, value):
+        if not isinstance(value, tuple):
+            return value
+        tag = value[0]
+        if tag == 'R':
+            return pg.Rect(value[1], value[2], value[3], value[4])
+        if tag == 'F':
+            return sprite.frames[value[1]]
+        if tag == 'I':
+            return getattr(sprite, value[1])[value[2]]
+        if tag == 'L':
+            return getattr(sprite, value[1])
+        if tag == 'O':
+            return self.objects[value[1]]
+        if tag == 'P':
+            return getattr(sprite, name)
+        return tuple(self.decode_value(sprite, name, item) for item in value[1:])
+
+    def decode(self, sprite, schema, values):
+        """Writes saved values back onto a sprite"""
+        names = self.schemas[schema]
+        attributes = sprite.__dict__
+        for name in attributes.keys() - names - SKIPPED:
+            if not is_frame_list(attributes[name]):
+                del attributes[name]
+        for name, value in zip(names, values):
+            attributes[name] = self.decode_value(sprite, name, value)
+        return sprite
+
+    def create(self, key, schema, values):
+        """Recreates a sprite that didn't exist at level startup"""
+        base = prototype(key)
+        sprite = base.__class__.__new__(base.__class__)
+        pg.sprite.Sprite.__init__(sprite)
+        for name, value in base.__dict__.items():
+            if name != '_Sprite__g':
+                sprite.__dict__[name] = value
+        return self.decode(sprite, schema, values)
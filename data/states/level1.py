@@ -1,10 +1,17 @@
 from __future__ import division
 
 
+import bisect
+import marshal
+import zlib
 import pygame as pg
 from .. import setup, tools
 from .. import constants as c
 from .. import game_sound
+from .. import snapshot
+from .. import background
+from .. import levels
+from .. import collision
 from .. components import mario
 from .. components import collider
 from .. components import bricks
@@ -18,9 +25,20 @@ from .. components import castle_flag
 from data import constants as const
 from ..components.popup_text import PopupText
 
+# States in which a brick, coin box or the flag can sleep: its update
+# wouldn't change anything that matters for the game
+REST_STATES = frozenset((c.RESTING, c.OPENED, c.TOP_OF_POLE, c.BOTTOM_OF_POLE))
+
+# Enemy kinds of the level files
+ENEMIES = {c.GOOMBA: enemies.Goomba,
+           c.KOOPA: enemies.Koopa}
+
 class Level1(tools._State):
     def __init__(self):
         tools._State.__init__(self)
+        self.level_name = 'level_1'
+        self.active_margin = c.ACTIVE_MARGIN
+        self.checksum = None
 
     def startup(self, current_time, persist):
         """Called when the State object is created"""
@@ -43,6 +61,7 @@ class Level1(tools._State):
         self.overhead_info_display = info.OverheadInfo(self.game_info, c.LEVEL)
         self.sound_manager = game_sound.Sound(self.overhead_info_display)
 
+        self.level_data = levels.load(self.level_name)
         self.setup_background()
         self.setup_ground()
         self.setup_pipes()
@@ -54,265 +73,95 @@ class Level1(tools._State):
         self.setup_mario()
         self.setup_checkpoints()
         self.setup_spritegroups()
+        self.static_sprites = self.startup_sprites()
+        self.store_previous_positions()
+        self.sprites_drawn = 0
+        self.sprites_culled = 0
         self.popup = PopupText()
 
     def setup_background(self):
         """Sets the background image, rect and scales it to the correct
         proportions"""
-        self.background = setup.GFX['level_1']
-        self.back_rect = self.background.get_rect()
-        self.background = pg.transform.scale(self.background,
-                                  (int(self.back_rect.width*c.BACKGROUND_MULTIPLER),
-                                  int(self.back_rect.height*c.BACKGROUND_MULTIPLER)))
+        self.background = setup.get_background(self.level_data.background,
+                                               c.BACKGROUND_MULTIPLER)
         self.back_rect = self.background.get_rect()
-        width = self.back_rect.width
-        height = self.back_rect.height
-
-        self.level = pg.Surface((width, height)).convert()
-        self.level_rect = self.level.get_rect()
+        self.level_rect = self.back_rect.copy()
         self.viewport = setup.SCREEN.get_rect(bottom=self.level_rect.bottom)
         self.viewport.x = self.game_info[c.CAMERA_START_X]
+        self.background_layer = background.ScrollingBackground(
+            self.background, self.viewport.size)
 
 
     def setup_ground(self):
         """Creates collideable, invisible rectangles over top of the ground for
         sprites to walk on"""
-        ground_rect1 = collider.Collider(0, c.GROUND_HEIGHT,    2953, 60)
-        ground_rect2 = collider.Collider(3048, c.GROUND_HEIGHT,  635, 60)
-        ground_rect3 = collider.Collider(3819, c.GROUND_HEIGHT, 2735, 60)
-        ground_rect4 = collider.Collider(6647, c.GROUND_HEIGHT, 2300, 60)
-
-        self.ground_group = pg.sprite.Group(ground_rect1,
-                                           ground_rect2,
-                                           ground_rect3,
-                                           ground_rect4)
+        self.ground_group = pg.sprite.Group(
+            *[collider.Collider(*rect) for rect in self.level_data.ground])
 
 
     def setup_pipes(self):
         """Create collideable rects for all the pipes"""
-
-        pipe1 = collider.Collider(1202, 452, 83, 82)
-        pipe2 = collider.Collider(1631, 409, 83, 140)
-        pipe3 = collider.Collider(1973, 366, 83, 170)
-        pipe4 = collider.Collider(2445, 366, 83, 170)
-        pipe5 = collider.Collider(6989, 452, 83, 82)
-        pipe6 = collider.Collider(7675, 452, 83, 82)
-
-        self.pipe_group = pg.sprite.Group(pipe1, pipe2,
-                                          pipe3, pipe4,
-                                          pipe5, pipe6)
+        self.pipe_group = pg.sprite.Group(
+            *[collider.Collider(*rect) for rect in self.level_data.pipes])
 
 
     def setup_steps(self):
         """Create collideable rects for all the steps"""
-        step1 = collider.Collider(5745, 495, 40, 44)
-        step2 = collider.Collider(5788, 452, 40, 44)
-        step3 = collider.Collider(5831, 409, 40, 44)
-        step4 = collider.Collider(5874, 366, 40, 176)
-
-
-        step5 = collider.Collider(6001, 366, 40, 176)
-        step6 = collider.Collider(6044, 408, 40, 40)
-        step7 = collider.Collider(6087, 452, 40, 40)
-        step8 = collider.Collider(6130, 495, 40, 40)
-
-        step9 = collider.Collider(6345, 495, 40, 40)
-        step10 = collider.Collider(6388, 452, 40, 40)
-        step11 = collider.Collider(6431, 409, 40, 40)
-        step12 = collider.Collider(6474, 366, 40, 40)
-        step13 = collider.Collider(6517, 366, 40, 176)
-
-        step14 = collider.Collider(6644, 366, 40, 176)
-        step15 = collider.Collider(6687, 408, 40, 40)
-        step16 = collider.Collider(6728, 452, 40, 40)
-        step17 = collider.Collider(6771, 495, 40, 40)
-
-        step18 = collider.Collider(7760, 495, 40, 40)
-        step19 = collider.Collider(7803, 452, 40, 40)
-        step20 = collider.Collider(7845, 409, 40, 40)
-        step21 = collider.Collider(7888, 366, 40, 40)
-        step22 = collider.Collider(7931, 323, 40, 40)
-        step23 = collider.Collider(7974, 280, 40, 40)
-        step24 = collider.Collider(8017, 237, 40, 40)
-        step25 = collider.Collider(8060, 194, 40, 40)
-        step26 = collider.Collider(8103, 194, 40, 360)
-
-        step27 = collider.Collider(8488, 495, 40, 40)
-
-        self.step_group = pg.sprite.Group(step1,  step2,
-                                          step3,  step4,
-                                          step5,  step6,
-                                          step7,  step8,
-                                          step9,  step10,
-                                          step11, step12,
-                                          step13, step14,
-                                          step15, step16,
-                                          step17, step18,
-                                          step19, step20,
-                                          step21, step22,
-                                          step23, step24,
-                                          step25, step26,
-                                          step27)
+        self.step_group = pg.sprite.Group(
+            *[collider.Collider(*rect) for rect in self.level_data.steps])
 
 
     def setup_bricks(self):
         """Creates all the breakable bricks for the level.  Coin and
         powerup groups are created so they can be passed to bricks."""
         self.coin_group = pg.sprite.Group()
-        self.powerup_group = pg.sprite.Group()
+        self.powerup_group = collision.SpatialGroup()
         self.brick_pieces_group = pg.sprite.Group()
 
-        brick1  = bricks.Brick(858,  365)
-        brick2  = bricks.Brick(944,  365)
-        brick3  = bricks.Brick(1030, 365)
-        brick4  = bricks.Brick(3299, 365)
-        brick5  = bricks.Brick(3385, 365)
-        brick6  = bricks.Brick(3430, 193)
-        brick7  = bricks.Brick(3473, 193)
-        brick8  = bricks.Brick(3516, 193)
-        brick9  = bricks.Brick(3559, 193)
-        brick10 = bricks.Brick(3602, 193)
-        brick11 = bricks.Brick(3645, 193)
-        brick12 = bricks.Brick(3688, 193)
-        brick13 = bricks.Brick(3731, 193)
-        brick14 = bricks.Brick(3901, 193)
-        brick15 = bricks.Brick(3944, 193)
-        brick16 = bricks.Brick(3987, 193)
-        brick17 = bricks.Brick(4030, 365, c.SIXCOINS, self.coin_group)
-        brick18 = bricks.Brick(4287, 365)
-        brick19 = bricks.Brick(4330, 365, c.STAR, self.powerup_group)
-        brick20 = bricks.Brick(5058, 365)
-        brick21 = bricks.Brick(5187, 193)
-        brick22 = bricks.Brick(5230, 193)
-        brick23 = bricks.Brick(5273, 193)
-        brick24 = bricks.Brick(5488, 193)
-        brick25 = bricks.Brick(5574, 193)
-        brick26 = bricks.Brick(5617, 193)
-        brick27 = bricks.Brick(5531, 365)
-        brick28 = bricks.Brick(5574, 365)
-        brick29 = bricks.Brick(7202, 365)
-        brick30 = bricks.Brick(7245, 365)
-        brick31 = bricks.Brick(7331, 365)
-
-        self.brick_group = pg.sprite.Group(brick1,  brick2,
-                                           brick3,  brick4,
-                                           brick5,  brick6,
-                                           brick7,  brick8,
-                                           brick9,  brick10,
-                                           brick11, brick12,
-                                           brick13, brick14,
-                                           brick15, brick16,
-                                           brick17, brick18,
-                                           brick19, brick20,
-                                           brick21, brick22,
-                                           brick23, brick24,
-                                           brick25, brick26,
-                                           brick27, brick28,
-                                           brick29, brick30,
-                                           brick31)
+        self.brick_group = collision.SpatialGroup()
+        for x, y, contents in self.level_data.bricks:
+            if contents == c.SIXCOINS:
+                self.brick_group.add(bricks.Brick(x, y, contents, self.coin_group))
+            elif contents:
+                self.brick_group.add(bricks.Brick(x, y, contents, self.powerup_group))
+            else:
+                self.brick_group.add(bricks.Brick(x, y))
 
 
     def setup_coin_boxes(self):
         """Creates all the coin boxes and puts them in a sprite group"""
-        coin_box1  = coin_box.Coin_box(685, 365, c.COIN, self.coin_group)
-        coin_box2  = coin_box.Coin_box(901, 365, c.FIREFLOWER, self.powerup_group)
-        coin_box3  = coin_box.Coin_box(987, 365, c.COIN, self.coin_group)
-        coin_box4  = coin_box.Coin_box(943, 193, c.COIN, self.coin_group)
-        coin_box5  = coin_box.Coin_box(3342, 365, c.MUSHROOM, self.powerup_group)
-        coin_box6  = coin_box.Coin_box(4030, 193, c.COIN, self.coin_group)
-        coin_box7  = coin_box.Coin_box(4544, 365, c.FIREFLOWER, self.powerup_group)
-        coin_box8  = coin_box.Coin_box(4672, 365, c.COIN, self.coin_group)
-        coin_box9  = coin_box.Coin_box(4672, 193, c.MUSHROOM, self.powerup_group)
-        coin_box10 = coin_box.Coin_box(4800, 365, c.COIN, self.coin_group)
-        coin_box11 = coin_box.Coin_box(5531, 193, c.FIREFLOWER, self.powerup_group)
-        coin_box12 = coin_box.Coin_box(7288, 365, c.COIN, self.coin_group)
-        coin_box13 = coin_box.Coin_box(7374, 365, c.COIN, self.coin_group)
-        coin_box14 = coin_box.Coin_box(7460, 365, c.FIREFLOWER, self.powerup_group)
-        coin_box15 = coin_box.Coin_box(7560, 193, c.COIN, self.coin_group)
-
-        self.coin_box_group = pg.sprite.Group(coin_box1,  coin_box2,
-                                              coin_box3,  coin_box4,
-                                              coin_box5,  coin_box6,
-                                              coin_box7,  coin_box8,
-                                              coin_box9,  coin_box10,
-                                              coin_box11, coin_box12,
-                                              coin_box13, coin_box14,
-                                              coin_box15)
+        self.coin_box_group = collision.SpatialGroup()
+        for x, y, contents, slide in self.level_data.coin_boxes:
+            if contents == c.COIN:
+                group = self.coin_group
+            else:
+                group = self.powerup_group
+            self.coin_box_group.add(
+                coin_box.Coin_box(x, y, contents, group, slide))
+        # Never drawn or put to sleep: boxes waking up copy its animation
+        self.coin_box_clock = coin_box.Coin_box(0, 0)
 
 
     def setup_flag_pole(self):
         """Creates the flag pole at the end of the level"""
-        self.flag = flagpole.Flag(8505, 100)
-
-        pole0 = flagpole.Pole(8505, 97)
-        pole1 = flagpole.Pole(8505, 137)
-        pole2 = flagpole.Pole(8505, 177)
-        pole3 = flagpole.Pole(8505, 217)
-        pole4 = flagpole.Pole(8505, 257)
-        pole5 = flagpole.Pole(8505, 297)
-        pole6 = flagpole.Pole(8505, 337)
-        pole7 = flagpole.Pole(8505, 377)
-        pole8 = flagpole.Pole(8505, 417)
-        pole9 = flagpole.Pole(8505, 450)
-
-        finial = flagpole.Finial(8507, 97)
-
-        self.flag_pole_group = pg.sprite.Group(self.flag,
-                                               finial,
-                                               pole0,
-                                               pole1,
-                                               pole2,
-                                               pole3,
-                                               pole4,
-                                               pole5,
-                                               pole6,
-                                               pole7,
-                                               pole8,
-                                               pole9)
+        self.flag = flagpole.Flag(*self.level_data.flag)
+        finial = flagpole.Finial(*self.level_data.finial)
+        poles = [flagpole.Pole(x, y) for x, y in self.level_data.poles]
+
+        self.flag_pole_group = collision.SpatialGroup(self.flag, finial, *poles)
 
 
     def setup_enemies(self):
-        """Creates all the enemies and stores them in a list of lists."""
-        goomba0 = enemies.Goomba()
-        goomba1 = enemies.Goomba()
-        goomba2 = enemies.Goomba()
-        goomba3 = enemies.Goomba()
-        goomba4 = enemies.Goomba(193)
-        goomba5 = enemies.Goomba(193)
-        goomba6 = enemies.Goomba()
-        goomba7 = enemies.Goomba()
-        goomba8 = enemies.Goomba()
-        goomba9 = enemies.Goomba()
-        goomba10 = enemies.Goomba()
-        goomba11 = enemies.Goomba()
-        goomba12 = enemies.Goomba()
-        goomba13 = enemies.Goomba()
-        goomba14 = enemies.Goomba()
-        goomba15 = enemies.Goomba()
-
-        koopa0 = enemies.Koopa()
-
-        enemy_group1 = pg.sprite.Group(goomba0)
-        enemy_group2 = pg.sprite.Group(goomba1)
-        enemy_group3 = pg.sprite.Group(goomba2, goomba3)
-        enemy_group4 = pg.sprite.Group(goomba4, goomba5)
-        enemy_group5 = pg.sprite.Group(goomba6, goomba7)
-        enemy_group6 = pg.sprite.Group(koopa0)
-        enemy_group7 = pg.sprite.Group(goomba8, goomba9)
-        enemy_group8 = pg.sprite.Group(goomba10, goomba11)
-        enemy_group9 = pg.sprite.Group(goomba12, goomba13)
-        enemy_group10 = pg.sprite.Group(goomba14, goomba15)
-
-        self.enemy_group_list = [enemy_group1,
-                                 enemy_group2,
-                                 enemy_group3,
-                                 enemy_group4,
-                                 enemy_group5,
-                                 enemy_group6,
-                                 enemy_group7,
-                                 enemy_group8,
-                                 enemy_group9,
-                                 enemy_group10]
+        """Creates the enemies each checkpoint sends in, as a list of
+        groups and by checkpoint name"""
+        self.enemy_group_list = []
+        self.checkpoint_enemies = {}
+        for x, name, y, width, height, spawn in self.level_data.checkpoints:
+            if spawn:
+                group = pg.sprite.Group(*[ENEMIES[kind](bottom)
+                                          for kind, bottom in spawn])
+                self.enemy_group_list.append(group)
+                self.checkpoint_enemies[name] = group
 
 
     def setup_mario(self):
@@ -325,54 +174,301 @@ class Level1(tools._State):
     def setup_checkpoints(self):
         """Creates invisible checkpoints that when collided will trigger
         the creation of enemies from the self.enemy_group_list"""
-        check1 = checkpoint.Checkpoint(510, "1")
-        check2 = checkpoint.Checkpoint(1400, '2')
-        check3 = checkpoint.Checkpoint(1740, '3')
-        check4 = checkpoint.Checkpoint(3080, '4')
-        check5 = checkpoint.Checkpoint(3750, '5')
-        check6 = checkpoint.Checkpoint(4150, '6')
-        check7 = checkpoint.Checkpoint(4470, '7')
-        check8 = checkpoint.Checkpoint(4950, '8')
-        check9 = checkpoint.Checkpoint(5100, '9')
-        check10 = checkpoint.Checkpoint(6800, '10')
-        check11 = checkpoint.Checkpoint(8504, '11', 5, 6)
-        check12 = checkpoint.Checkpoint(8775, '12')
-        check13 = checkpoint.Checkpoint(2740, 'secret_mushroom', 360, 40, 12)
-
-        self.check_point_group = pg.sprite.Group(check1, check2, check3,
-                                                 check4, check5, check6,
-                                                 check7, check8, check9,
-                                                 check10, check11, check12,
-                                                 check13)
+        self.checkpoints = [checkpoint.Checkpoint(x, name, y, width, height)
+                            for x, name, y, width, height, spawn
+                            in self.level_data.checkpoints]
+        self.checkpoint_lefts = [check.rect.left for check in self.checkpoints]
+        self.checkpoint_reach = max([check.rect.width
+                                     for check in self.checkpoints] or [0])
+        self.check_point_group = pg.sprite.Group(*self.checkpoints)
 
 
     def setup_spritegroups(self):
         """Sprite groups created for convenience"""
         self.sprites_about_to_die_group = pg.sprite.Group()
-        self.shell_group = pg.sprite.Group()
-        self.enemy_group = pg.sprite.Group()
+        self.shell_group = collision.SpatialGroup()
+        self.enemy_group = collision.SpatialGroup()
 
         self.ground_step_pipe_group = pg.sprite.Group(self.ground_group,
                                                       self.pipe_group,
                                                       self.step_group)
+        self.terrain = collision.TerrainGrid(self.ground_step_pipe_group)
 
         self.mario_and_enemy_group = pg.sprite.Group(self.mario,
                                                      self.enemy_group)
 
+        self.world = collision.CollisionWorld(
+            [(collision.TERRAIN, self.terrain),
+             (collision.COIN_BOX, self.coin_box_group),
+             (collision.BRICK, self.brick_group),
+             (collision.ENEMY, self.enemy_group),
+             (collision.SHELL, self.shell_group),
+             (collision.POWERUP, self.powerup_group)])
+
 
     def update(self, surface, keys, current_time):
+        """Advances the level by one fixed simulation step.  Drawing is
+        done separately in draw"""
         self.game_info[c.CURRENT_TIME] = self.current_time = current_time
+        self.store_previous_positions()
+        start = self.timer.now()
         self.handle_states(keys)
+        self.timer.add('handle_states', start)
         self.check_if_time_out()
+        self.popup.update()
+        self.sync_drawn_index()
+        if self.checksum is not None:
+            self.checksum = zlib.crc32(marshal.dumps(self.gameplay_state()),
+                                       self.checksum)
 
+        # --- Sonidos ---
+        start = self.timer.now()
+        self.sound_manager.update(self.game_info, self.mario)
+        self.timer.add('sound_manager.update', start)
+
+
+    def draw(self, surface, interpolation):
+        """Draws the level, with sprites placed between their previous and
+        current positions according to interpolation (0..1)"""
         # --- TODO el escenario ---
-        self.blit_everything(surface)
+        start = self.timer.now()
+        self.blit_everything(surface, interpolation)
+        start = self.timer.add('blit_everything', start)
 
         # --- SIEMPRE MOSTRAR POPUP AL FINAL ---
         self.popup.draw(surface)
-
-        # --- Sonidos ---
-        self.sound_manager.update(self.game_info, self.mario)
+        self.timer.add('popup.draw', start)
+
+
+    def store_previous_positions(self):
+        """Remembers where the sprites that can be drawn before the next
+        step were before this step, so those frames can be interpolated.
+        Only sprites near the viewport are looked at; one coming from
+        further away is drawn where it is"""
+        self.previous_positions = {}
+        near = self.viewport.inflate(4 * c.MAX_INTERPOLATION_DISTANCE,
+                                     4 * c.MAX_INTERPOLATION_DISTANCE)
+        for group in self.drawn_groups():
+            for sprite in self.sprites_near(group, near):
+                self.previous_positions[sprite] = sprite.rect.topleft
+        self.previous_viewport_x = self.viewport.x
+
+
+    def sprites_near(self, group, rect):
+        """The sprites of group overlapping rect.  Those of a SpatialGroup
+        are looked up in its grid instead of going through the group"""
+        if isinstance(group, collision.SpatialGroup):
+            return group.collide_all(rect)
+        return [sprite for sprite in group if sprite.rect.colliderect(rect)]
+
+
+    def drawn_groups(self):
+        """Sprite groups blitted onto the level, in drawing order"""
+        return (self.powerup_group,
+                self.coin_group,
+                self.brick_group,
+                self.coin_box_group,
+                self.sprites_about_to_die_group,
+                self.shell_group,
+                self.brick_pieces_group,
+                self.flag_pole_group,
+                self.mario_and_enemy_group)
+
+
+    def interpolate(self, previous, current, interpolation):
+        """Returns a coordinate between previous and current.  Big jumps,
+        like a sprite being respawned, are not smoothed"""
+        if abs(current - previous) > c.MAX_INTERPOLATION_DISTANCE:
+            return current
+        return int(round(previous + (current - previous) * interpolation))
+
+
+    def draw_group(self, group, surface, interpolation, viewport, view):
+        """Blits a sprite group at interpolated positions, relative to the
+        top left of viewport.  Only the sprites of a SpatialGroup that
+        overlap view are drawn; they are looked up in its grid, the others
+        are counted in sprites_culled.  Sprites with visible set to False,
+        like Mario blinking, are skipped"""
+        sprites = group
+        if isinstance(group, collision.SpatialGroup):
+            sprites = group.collide_all(view)
+            self.sprites_culled += len(group) - len(sprites)
+        self.sprites_drawn += len(sprites)
+        left, top = viewport.topleft
+        for sprite in sprites:
+            if not getattr(sprite, 'visible', True):
+                continue
+            x, y = sprite.rect.topleft
+            previous = self.previous_positions.get(sprite)
+            if previous:
+                x = self.interpolate(previous[0], x, interpolation)
+                y = self.interpolate(previous[1], y, interpolation)
+            surface.blit(sprite.image, (x - left, y - top))
+
+
+    def sync_drawn_index(self):
+        """Catches the grids of the drawn groups up with the sprites moved
+        by a simulation step.  Done at the end of every step, so drawing
+        only reads them however many frames are drawn"""
+        self.world.sync()
+        self.flag_pole_group.sync()
+
+
+    def startup_sprites(self):
+        """Every sprite created by startup, in creation order.  Snapshots
+        refer to these by position instead of recreating them"""
+        sprites = []
+        for group in (self.ground_group, self.pipe_group, self.step_group,
+                      self.brick_group, self.coin_box_group,
+                      self.flag_pole_group):
+            sprites.extend(group.sprites())
+        for group in self.enemy_group_list:
+            sprites.extend(group.sprites())
+        sprites.extend(self.check_point_group.sprites())
+        sprites.append(self.mario)
+        sprites.append(self.coin_box_clock)
+        return sprites
+
+
+    def named_groups(self):
+        """(name, group) for every sprite group a snapshot has to save"""
+        groups = [('ground_group', self.ground_group),
+                  ('pipe_group', self.pipe_group),
+                  ('step_group', self.step_group),
+                  ('ground_step_pipe_group', self.ground_step_pipe_group),
+                  ('coin_group', self.coin_group),
+                  ('powerup_group', self.powerup_group),
+                  ('brick_pieces_group', self.brick_pieces_group),
+                  ('brick_group', self.brick_group),
+                  ('coin_box_group', self.coin_box_group),
+                  ('flag_pole_group', self.flag_pole_group),
+                  ('check_point_group', self.check_point_group),
+                  ('sprites_about_to_die_group', self.sprites_about_to_die_group),
+                  ('shell_group', self.shell_group),
+                  ('enemy_group', self.enemy_group),
+                  ('mario_and_enemy_group', self.mario_and_enemy_group)]
+        for i, group in enumerate(self.enemy_group_list):
+            groups.append(('enemy_group_list.{}'.format(i), group))
+        return groups
+
+
+    def sprite_codec(self, groups):
+        """Codec that maps the level's shared objects to names"""
+        objects = dict(groups)
+        objects['moving_score_list'] = self.moving_score_list
+        objects['viewport'] = self.viewport
+        references = dict((id(value), name) for name, value in objects.items())
+        return snapshot.SpriteCodec(references, objects)
+
+
+    def snapshot(self):
+        """Returns the simulation state of the level as a compact
+        versioned blob.  Surfaces are not included"""
+        groups = self.named_groups()
+        codec = self.sprite_codec(groups)
+        numbers = dict((sprite, i) for i, sprite in enumerate(self.static_sprites))
+
+        static = []
+        for i, sprite in enumerate(self.static_sprites):
+            if not isinstance(sprite, snapshot.IMMUTABLE):
+                static.append((i,) + codec.encode(sprite))
+
+        dynamic = []
+        members = []
+        for name, group in groups:
+            group_members = []
+            for sprite in group.sprites():
+                if sprite not in numbers:
+                    numbers[sprite] = len(numbers)
+                    dynamic.append((snapshot.class_key(sprite),) + codec.encode(sprite))
+                group_members.append(numbers[sprite])
+            members.append(group_members)
+
+        info = self.overhead_info_display
+        flashing_coin = info.flashing_coin
+        flag_score = None
+        if self.flag_score:
+            flag_score = snapshot.encode_score(self.flag_score)
+
+        return snapshot.pack({
+            'level': (self.state, self.death_timer, self.flag_timer,
+                      self.flag_score_total, self.popup_x_key_pressed,
+                      getattr(self, 'last_x_position', None),
+                      self.current_time, self.done, self.next),
+            'game_info': dict(self.game_info),
+            'viewport': self.viewport.x,
+            'info': (info.time, info.current_time, info.state,
+                     getattr(info, 'score', None), flashing_coin.frame_index,
+                     flashing_coin.timer, flashing_coin.first_half),
+            'sound': self.sound_manager.state,
+            'popup': (const.POPUP_ACTIVE, const.REQUEST_POPUP_TEXT,
+                      const.DIAPOSITIVA_INDEX, self.popup.active,
+                      self.popup._anim_progress, self.popup.image_path),
+            'schemas': codec.schemas,
+            'static': static,
+            'dynamic': dynamic,
+            'groups': members,
+            'scores': [snapshot.encode_score(moving_score)
+                       for moving_score in self.moving_score_list],
+            'flag_score': flag_score})
+
+
+    def restore(self, blob):
+        """Puts the level back into the state saved by snapshot.  Sprites
+        that existed at startup are reused, the rest are recreated"""
+        data = snapshot.unpack(blob)
+        if not hasattr(self, 'static_sprites'):
+            self.startup(data['level'][6], dict(data['game_info']))
+
+        self.game_info.clear()
+        self.game_info.update(data['game_info'])
+        (self.state, self.death_timer, self.flag_timer, self.flag_score_total,
+         self.popup_x_key_pressed, self.last_x_position, self.current_time,
+         self.done, self.next) = data['level']
+        self.viewport.x = data['viewport']
+
+        groups = self.named_groups()
+        codec = self.sprite_codec(groups)
+        codec.schemas = data['schemas']
+        sprites = list(self.static_sprites)
+        for number, schema, values in data['static']:
+            codec.decode(sprites[number], schema, values)
+        for key, schema, values in data['dynamic']:
+            sprites.append(codec.create(key, schema, values))
+        for (name, group), group_members in zip(groups, data['groups']):
+            group_sprites = [sprites[number] for number in group_members]
+            if group.sprites() != group_sprites:
+                group.empty()
+                group.add(*group_sprites)
+
+        self.moving_score_list[:] = [snapshot.decode_score(record)
+                                     for record in data['scores']]
+        self.flag_score = None
+        if data['flag_score']:
+            self.flag_score = snapshot.decode_score(data['flag_score'])
+
+        info = self.overhead_info_display
+        (info.time, info.current_time, info.state, score,
+         flashing_coin_frame, flashing_coin_timer, first_half) = data['info']
+        info.flashing_coin.frame_index = flashing_coin_frame
+        info.flashing_coin.timer = flashing_coin_timer
+        info.flashing_coin.first_half = first_half
+        info.flashing_coin.image = info.flashing_coin.frames[flashing_coin_frame]
+        if score is not None:
+            info.score = score
+            info.update_score_images(info.score_images, score)
+        info.set_count_down_images()
+        info.update_coin_total(self.game_info)
+        self.sound_manager.state = data['sound']
+
+        (const.POPUP_ACTIVE, const.REQUEST_POPUP_TEXT, const.DIAPOSITIVA_INDEX,
+         popup_active, popup_progress, popup_path) = data['popup']
+        if popup_active and popup_path != self.popup.image_path:
+            self.popup.show(popup_path)
+        self.popup.active = popup_active
+        self.popup._anim_progress = popup_progress
+        self.sync_drawn_index()
+        self.store_previous_positions()
 
 
 
@@ -431,8 +527,9 @@ class Level1(tools._State):
         if self.flag_score:
             self.flag_score.update(None, self.game_info)
             self.check_to_add_flag_score()
-        self.coin_box_group.update(self.game_info)
-        self.flag_pole_group.update(self.game_info)
+        window = self.active_window()
+        self.update_coin_boxes(window)
+        self.update_awake(self.flag_pole_group, window, self.game_info)
         self.check_if_mario_in_transition_state()
         self.check_flag()
         self.check_for_mario_death()
@@ -460,7 +557,11 @@ class Level1(tools._State):
             return
 
         # --- ACTUALIZACIÓN NORMAL DE SPRITES ---
+        timer = self.timer
+        start = timer.now()
+        window = self.active_window()
         self.mario.update(keys, self.game_info, self.powerup_group)
+        start = timer.add('mario.update', start)
 
         for score in self.moving_score_list:
             score.update(self.moving_score_list, self.game_info)
@@ -468,39 +569,106 @@ class Level1(tools._State):
         if self.flag_score:
             self.flag_score.update(None, self.game_info)
             self.check_to_add_flag_score()
+        start = timer.add('scores.update', start)
 
-        self.flag_pole_group.update()
+        self.update_awake(self.flag_pole_group, window)
+        start = timer.add('flag_pole_group.update', start)
         self.check_points_check()
+        start = timer.add('check_points_check', start)
         self.enemy_group.update(self.game_info)
+        start = timer.add('enemy_group.update', start)
         self.sprites_about_to_die_group.update(self.game_info, self.viewport)
+        start = timer.add('sprites_about_to_die_group.update', start)
         self.shell_group.update(self.game_info)
-        self.brick_group.update()
-        self.coin_box_group.update(self.game_info)
+        start = timer.add('shell_group.update', start)
+        self.update_awake(self.brick_group, window)
+        start = timer.add('brick_group.update', start)
+        self.update_coin_boxes(window)
+        start = timer.add('coin_box_group.update', start)
         self.powerup_group.update(self.game_info, self.viewport)
+        start = timer.add('powerup_group.update', start)
         self.coin_group.update(self.game_info, self.viewport)
+        start = timer.add('coin_group.update', start)
         self.brick_pieces_group.update()
+        start = timer.add('brick_pieces_group.update', start)
 
         self.adjust_sprite_positions()
+        timer.add('adjust_sprite_positions', start)
         self.check_if_mario_in_transition_state()
         self.check_for_mario_death()
         self.update_viewport()
         self.overhead_info_display.update(self.game_info, self.mario)
 
+    def active_window(self):
+        """The part of the level where sprites are always simulated: the
+        viewport widened by active_margin on both sides.  None when
+        active_margin is None"""
+        if self.active_margin is None:
+            return None
+        return pg.Rect(self.viewport.x - self.active_margin, self.level_rect.y,
+                       self.viewport.w + 2 * self.active_margin,
+                       self.level_rect.h)
+
+
+    def is_awake(self, sprite, window):
+        """Sprites sleep while they are at rest outside the window.  They
+        are still collided with; the spatial indexes never look at them
+        unless something comes close"""
+        return (window is None
+                or getattr(sprite, 'state', c.RESTING) not in REST_STATES
+                or sprite.rect.colliderect(window))
+
+
+    def update_awake(self, group, window, *args):
+        """Updates the sprites of a group that aren't asleep, in group
+        order"""
+        for sprite in group.sprites():
+            if self.is_awake(sprite, window):
+                sprite.update(*args)
+
+
+    def update_coin_boxes(self, window):
+        """Updates the awake coin boxes.  Every resting box shimmers in
+        step, so one that just woke up takes the animation of
+        coin_box_clock instead of carrying on from where it fell asleep"""
+        clock = self.coin_box_clock
+        clock.update(self.game_info)
+        for box in self.coin_box_group.sprites():
+            if self.is_awake(box, window):
+                box.update(self.game_info)
+                if box.state == c.RESTING:
+                    box.follow(clock)
+
+
+    def gameplay_state(self):
+        """Position, state and velocity of Mario and of every sprite in
+        the level, with the camera and game_info: what the checksum covers.
+        Animation frames are left out, so a run with sleeping sprites has
+        the same checksum as one without"""
+        sprites = [self.mario]
+        for name, group in self.named_groups():
+            sprites.extend(group.sprites())
+        return ([(sprite.__class__.__name__, tuple(sprite.rect),
+                  getattr(sprite, 'state', None),
+                  getattr(sprite, 'x_vel', 0), getattr(sprite, 'y_vel', 0))
+                 for sprite in sprites],
+                self.state, self.viewport.x, sorted(self.game_info.items()))
+
+
     def check_points_check(self):
         """Detect if checkpoint collision occurs, delete checkpoint,
         add enemies to self.enemy_group"""
-        checkpoint = pg.sprite.spritecollideany(self.mario,
-                                                 self.check_point_group)
+        checkpoint = self.checkpoint_at(self.mario.rect)
         if checkpoint:
             checkpoint.kill()
 
-            for i in range(1,11):
-                if checkpoint.name == str(i):
-                    for index, enemy in enumerate(self.enemy_group_list[i -1]):
-                        enemy.rect.x = self.viewport.right + (index * 60)
-                    self.enemy_group.add(self.enemy_group_list[i-1])
+            if checkpoint.name in self.checkpoint_enemies:
+                group = self.checkpoint_enemies[checkpoint.name]
+                for index, enemy in enumerate(group):
+                    enemy.rect.x = self.viewport.right + (index * 60)
+                self.enemy_group.add(group)
 
-            if checkpoint.name == '11':
+            if checkpoint.name == 'flag_pole':
                 self.mario.state = c.FLAGPOLE
                 self.mario.invincible = False
                 self.mario.flag_pole_right = checkpoint.rect.right
@@ -509,7 +677,7 @@ class Level1(tools._State):
                 self.flag.state = c.SLIDE_DOWN
                 self.create_flag_points()
 
-            elif checkpoint.name == '12':
+            elif checkpoint.name == 'castle':
                 self.state = c.IN_CASTLE
                 self.mario.kill()
                 self.mario.state == c.STAND
@@ -532,10 +700,23 @@ class Level1(tools._State):
             self.mario_and_enemy_group.add(self.enemy_group)
 
 
+    def checkpoint_at(self, rect):
+        """The first checkpoint by x, among those not yet reached, that rect
+        overlaps.  Only the checkpoints starting less than the widest one's
+        width to the left of rect are looked at"""
+        lefts = self.checkpoint_lefts
+        first = bisect.bisect_left(lefts, rect.left - self.checkpoint_reach)
+        last = bisect.bisect_left(lefts, rect.right)
+        for check in self.checkpoints[first:last]:
+            if check.rect.colliderect(rect) and self.check_point_group.has(check):
+                return check
+        return None
+
+
     def create_flag_points(self):
         """Creates the points that appear when Mario touches the
         flag pole"""
-        x = 8518
+        x = self.level_data.flag_score_x
         y = c.GROUND_HEIGHT - 60
         mario_bottom = self.mario.rect.bottom
 
@@ -558,10 +739,18 @@ class Level1(tools._State):
 
     def adjust_sprite_positions(self):
         """Adjusts sprites by their x and y velocities and collisions"""
+        timer = self.timer
+        start = timer.now()
+        self.world.sync()
         self.adjust_mario_position()
+        self.world.sync()
+        start = timer.add('adjust_mario_position', start)
         self.adjust_enemy_position()
+        start = timer.add('adjust_enemy_position', start)
         self.adjust_shell_position()
+        start = timer.add('adjust_shell_position', start)
         self.adjust_powerup_position()
+        timer.add('adjust_powerup_position', start)
 
 
     def adjust_mario_position(self):
@@ -581,12 +770,13 @@ class Level1(tools._State):
 
     def check_mario_x_collisions(self):
         """Check for collisions after Mario is moved on the x axis"""
-        collider = pg.sprite.spritecollideany(self.mario, self.ground_step_pipe_group)
-        coin_box = pg.sprite.spritecollideany(self.mario, self.coin_box_group)
-        brick = pg.sprite.spritecollideany(self.mario, self.brick_group)
-        enemy = pg.sprite.spritecollideany(self.mario, self.enemy_group)
-        shell = pg.sprite.spritecollideany(self.mario, self.shell_group)
-        powerup = pg.sprite.spritecollideany(self.mario, self.powerup_group)
+        contacts = self.world.contacts(self.mario.rect)
+        collider = contacts.get(collision.TERRAIN)
+        coin_box = contacts.get(collision.COIN_BOX)
+        brick = contacts.get(collision.BRICK)
+        enemy = contacts.get(collision.ENEMY)
+        shell = contacts.get(collision.SHELL)
+        powerup = contacts.get(collision.POWERUP)
 
         if coin_box:
             self.adjust_mario_for_x_collisions(coin_box)
@@ -722,6 +912,7 @@ class Level1(tools._State):
                 shell.rect.x += -5
 
             shell.state = c.SHELL_SLIDE
+            self.world.relocate(collision.SHELL, shell)
 
         elif shell.state == c.SHELL_SLIDE:
             if self.mario.big and not self.mario.invincible:
@@ -742,12 +933,13 @@ class Level1(tools._State):
 
     def check_mario_y_collisions(self):
         """Checks for collisions when Mario moves along the y-axis"""
-        ground_step_or_pipe = pg.sprite.spritecollideany(self.mario, self.ground_step_pipe_group)
-        enemy = pg.sprite.spritecollideany(self.mario, self.enemy_group)
-        shell = pg.sprite.spritecollideany(self.mario, self.shell_group)
-        brick = pg.sprite.spritecollideany(self.mario, self.brick_group)
-        coin_box = pg.sprite.spritecollideany(self.mario, self.coin_box_group)
-        powerup = pg.sprite.spritecollideany(self.mario, self.powerup_group)
+        contacts = self.world.contacts(self.mario.rect)
+        ground_step_or_pipe = contacts.get(collision.TERRAIN)
+        enemy = contacts.get(collision.ENEMY)
+        shell = contacts.get(collision.SHELL)
+        brick = contacts.get(collision.BRICK)
+        coin_box = contacts.get(collision.COIN_BOX)
+        powerup = contacts.get(collision.POWERUP)
 
         brick, coin_box = self.prevent_collision_conflict(brick, coin_box)
 
@@ -868,7 +1060,7 @@ class Level1(tools._State):
         """Kills enemy if on a bumped or broken brick"""
         brick.rect.y -= 5
 
-        enemy = pg.sprite.spritecollideany(brick, self.enemy_group)
+        enemy = self.world.collide_any(brick.rect, (collision.ENEMY,))
 
         if enemy:
             setup.SFX['kick'].play()
@@ -907,12 +1099,8 @@ class Level1(tools._State):
         """Changes Mario to a FALL state if more than a pixel above a pipe,
         ground, step or box"""
         self.mario.rect.y += 1
-        test_collide_group = pg.sprite.Group(self.ground_step_pipe_group,
-                                                 self.brick_group,
-                                                 self.coin_box_group)
-
 
-        if pg.sprite.spritecollideany(self.mario, test_collide_group) is None:
+        if self.world.collide_any(self.mario.rect, collision.SOLIDS) is None:
             if self.mario.state != c.JUMP \
                 and self.mario.state != c.DEATH_JUMP \
                 and self.mario.state != c.SMALL_TO_BIG \
@@ -980,6 +1168,7 @@ class Level1(tools._State):
             enemy.rect.y += enemy.y_vel
             self.check_enemy_y_collisions(enemy)
             self.delete_if_off_screen(enemy)
+            self.world.relocate(collision.ENEMY, enemy)
 
 
     def check_enemy_x_collisions(self, enemy):
@@ -987,8 +1176,10 @@ class Level1(tools._State):
         in order to check against all other enemies then adds it back."""
         enemy.kill()
 
-        collider = pg.sprite.spritecollideany(enemy, self.ground_step_pipe_group)
-        enemy_collider = pg.sprite.spritecollideany(enemy, self.enemy_group)
+        contacts = self.world.contacts(enemy.rect,
+                                       (collision.TERRAIN, collision.ENEMY))
+        collider = contacts.get(collision.TERRAIN)
+        enemy_collider = contacts.get(collision.ENEMY)
 
         if collider:
             if enemy.direction == c.RIGHT:
@@ -1016,14 +1207,15 @@ class Level1(tools._State):
                 enemy_collider.x_vel = -2
 
         self.enemy_group.add(enemy)
-        self.mario_and_enemy_group.add(self.enemy_group)
+        self.mario_and_enemy_group.add(enemy)
 
 
     def check_enemy_y_collisions(self, enemy):
         """Enemy collisions on the y axis"""
-        collider = pg.sprite.spritecollideany(enemy, self.ground_step_pipe_group)
-        brick = pg.sprite.spritecollideany(enemy, self.brick_group)
-        coin_box = pg.sprite.spritecollideany(enemy, self.coin_box_group)
+        contacts = self.world.contacts(enemy.rect, collision.SOLIDS)
+        collider = contacts.get(collision.TERRAIN)
+        brick = contacts.get(collision.BRICK)
+        coin_box = contacts.get(collision.COIN_BOX)
 
         if collider:
             if enemy.rect.bottom > collider.rect.bottom:
@@ -1079,10 +1271,7 @@ class Level1(tools._State):
 
         else:
             enemy.rect.y += 1
-            test_group = pg.sprite.Group(self.ground_step_pipe_group,
-                                         self.coin_box_group,
-                                         self.brick_group)
-            if pg.sprite.spritecollideany(enemy, test_group) is None:
+            if self.world.collide_any(enemy.rect, collision.SOLIDS) is None:
                 if enemy.state != c.JUMP:
                     enemy.state = c.FALL
 
@@ -1099,12 +1288,15 @@ class Level1(tools._State):
             shell.rect.y += shell.y_vel
             self.check_shell_y_collisions(shell)
             self.delete_if_off_screen(shell)
+            self.world.relocate(collision.SHELL, shell)
 
 
     def check_shell_x_collisions(self, shell):
         """Shell collisions along the x axis"""
-        collider = pg.sprite.spritecollideany(shell, self.ground_step_pipe_group)
-        enemy = pg.sprite.spritecollideany(shell, self.enemy_group)
+        contacts = self.world.contacts(shell.rect,
+                                       (collision.TERRAIN, collision.ENEMY))
+        collider = contacts.get(collision.TERRAIN)
+        enemy = contacts.get(collision.ENEMY)
 
         if collider:
             setup.SFX['bump'].play()
@@ -1128,7 +1320,7 @@ class Level1(tools._State):
 
     def check_shell_y_collisions(self, shell):
         """Shell collisions along the y axis"""
-        collider = pg.sprite.spritecollideany(shell, self.ground_step_pipe_group)
+        collider = self.world.collide_any(shell.rect, (collision.TERRAIN,))
 
         if collider:
             shell.y_vel = 0
@@ -1137,7 +1329,7 @@ class Level1(tools._State):
 
         else:
             shell.rect.y += 1
-            if pg.sprite.spritecollideany(shell, self.ground_step_pipe_group) is None:
+            if self.world.collide_any(shell.rect, (collision.TERRAIN,)) is None:
                 shell.state = c.FALL
             shell.rect.y -= 1
 
@@ -1153,6 +1345,7 @@ class Level1(tools._State):
                 self.adjust_fireball_position(powerup)
             elif powerup.name == '1up_mushroom':
                 self.adjust_mushroom_position(powerup)
+            self.world.relocate(collision.POWERUP, powerup)
 
 
     def adjust_mushroom_position(self, mushroom):
@@ -1168,36 +1361,22 @@ class Level1(tools._State):
 
     def check_mushroom_x_collisions(self, mushroom):
         """Mushroom collisions along the x axis"""
-        collider = pg.sprite.spritecollideany(mushroom, self.ground_step_pipe_group)
-        brick = pg.sprite.spritecollideany(mushroom, self.brick_group)
-        coin_box = pg.sprite.spritecollideany(mushroom, self.coin_box_group)
+        collider = self.world.collide_any(mushroom.rect, collision.ITEM_SOLIDS)
 
         if collider:
             self.adjust_mushroom_for_collision_x(mushroom, collider)
 
-        elif brick:
-            self.adjust_mushroom_for_collision_x(mushroom, brick)
-
-        elif coin_box:
-            self.adjust_mushroom_for_collision_x(mushroom, coin_box)
-
 
     def check_mushroom_y_collisions(self, mushroom):
         """Mushroom collisions along the y axis"""
-        collider = pg.sprite.spritecollideany(mushroom, self.ground_step_pipe_group)
-        brick = pg.sprite.spritecollideany(mushroom, self.brick_group)
-        coin_box = pg.sprite.spritecollideany(mushroom, self.coin_box_group)
+        collider = self.world.collide_any(mushroom.rect, collision.ITEM_SOLIDS)
 
         if collider:
             self.adjust_mushroom_for_collision_y(mushroom, collider)
-        elif brick:
-            self.adjust_mushroom_for_collision_y(mushroom, brick)
-        elif coin_box:
-            self.adjust_mushroom_for_collision_y(mushroom, coin_box)
         else:
-            self.check_if_falling(mushroom, self.ground_step_pipe_group)
-            self.check_if_falling(mushroom, self.brick_group)
-            self.check_if_falling(mushroom, self.coin_box_group)
+            self.check_if_falling(mushroom, (collision.TERRAIN,))
+            self.check_if_falling(mushroom, (collision.BRICK,))
+            self.check_if_falling(mushroom, (collision.COIN_BOX,))
 
 
     def adjust_mushroom_for_collision_x(self, item, collider):
@@ -1230,16 +1409,10 @@ class Level1(tools._State):
 
     def check_star_y_collisions(self, star):
         """Invincible star collisions along y axis"""
-        collider = pg.sprite.spritecollideany(star, self.ground_step_pipe_group)
-        brick = pg.sprite.spritecollideany(star, self.brick_group)
-        coin_box = pg.sprite.spritecollideany(star, self.coin_box_group)
+        collider = self.world.collide_any(star.rect, collision.ITEM_SOLIDS)
 
         if collider:
             self.adjust_star_for_collision_y(star, collider)
-        elif brick:
-            self.adjust_star_for_collision_y(star, brick)
-        elif coin_box:
-            self.adjust_star_for_collision_y(star, coin_box)
 
 
     def adjust_star_for_collision_y(self, star, collider):
@@ -1283,13 +1456,7 @@ class Level1(tools._State):
 
     def check_fireball_x_collisions(self, fireball):
         """Fireball collisions along x axis"""
-        collide_group = pg.sprite.Group(self.ground_group,
-                                        self.pipe_group,
-                                        self.step_group,
-                                        self.coin_box_group,
-                                        self.brick_group)
-
-        collider = pg.sprite.spritecollideany(fireball, collide_group)
+        collider = self.world.collide_any(fireball.rect, collision.SOLIDS)
 
         if collider:
             fireball.kill()
@@ -1300,15 +1467,12 @@ class Level1(tools._State):
 
     def check_fireball_y_collisions(self, fireball):
         """Fireball collisions along y axis"""
-        collide_group = pg.sprite.Group(self.ground_group,
-                                        self.pipe_group,
-                                        self.step_group,
-                                        self.coin_box_group,
-                                        self.brick_group)
-
-        collider = pg.sprite.spritecollideany(fireball, collide_group)
-        enemy = pg.sprite.spritecollideany(fireball, self.enemy_group)
-        shell = pg.sprite.spritecollideany(fireball, self.shell_group)
+        contacts = self.world.contacts(fireball.rect)
+        collider = contacts.get(collision.TERRAIN) \
+            or contacts.get(collision.COIN_BOX) \
+            or contacts.get(collision.BRICK)
+        enemy = contacts.get(collision.ENEMY)
+        shell = contacts.get(collision.SHELL)
 
         if collider and (fireball in self.powerup_group):
             fireball.rect.bottom = collider.rect.y
@@ -1335,11 +1499,11 @@ class Level1(tools._State):
         fireball.explode_transition()
 
 
-    def check_if_falling(self, sprite, sprite_group):
+    def check_if_falling(self, sprite, categories):
         """Checks if sprite should enter a falling state"""
         sprite.rect.y += 1
 
-        if pg.sprite.spritecollideany(sprite, sprite_group) is None:
+        if self.world.collide_any(sprite.rect, categories) is None:
             if sprite.state != c.JUMP:
                 sprite.state = c.FALL
 
@@ -1470,28 +1634,26 @@ class Level1(tools._State):
             self.done = True
 
 
-    def blit_everything(self, surface):
+    def blit_everything(self, surface, interpolation=1.0):
         """Blit all sprites to the main surface"""
-        
-
-        self.level.blit(self.background, self.viewport, self.viewport)
+        viewport = self.viewport.copy()
+        viewport.x = self.interpolate(self.previous_viewport_x,
+                                      self.viewport.x,
+                                      interpolation)
+
+        # Everything is drawn straight onto the screen, at its level
+        # position minus the camera's
+        self.background_layer.draw(surface, viewport)
         if self.flag_score:
-            self.flag_score.draw(self.level)
-        self.powerup_group.draw(self.level)
-        self.coin_group.draw(self.level)
-        self.brick_group.draw(self.level)
-        self.coin_box_group.draw(self.level)
-        self.sprites_about_to_die_group.draw(self.level)
-        self.shell_group.draw(self.level)
-        #self.check_point_group.draw(self.level)
-        self.brick_pieces_group.draw(self.level)
-        self.flag_pole_group.draw(self.level)
-        self.mario_and_enemy_group.draw(self.level)
-
-        surface.blit(self.level, (0,0), self.viewport)
+            self.flag_score.draw(surface, (-viewport.x, -viewport.y))
+        self.sprites_drawn = 0
+        self.sprites_culled = 0
+        # Sprites are drawn up to MAX_INTERPOLATION_DISTANCE away from
+        # where they are now
+        view = viewport.inflate(2 * c.MAX_INTERPOLATION_DISTANCE,
+                                2 * c.MAX_INTERPOLATION_DISTANCE)
+        for group in self.drawn_groups():
+            self.draw_group(group, surface, interpolation, viewport, view)
         self.overhead_info_display.draw(surface)
         for score in self.moving_score_list:
             score.draw(surface)
-        self.popup.draw(surface)
-
-
@@ -52,13 +52,8 @@ class Menu(tools._State):
 
     def setup_background(self):
         """Setup the background image to blit"""
-        self.background = setup.GFX['level_1']
+        self.background = setup.get_background('level_1', c.BACKGROUND_MULTIPLER)
         self.background_rect = self.background.get_rect()
-        self.background = pg.transform.scale(
-            self.background,
-            (int(self.background_rect.width * c.BACKGROUND_MULTIPLER),
-            int(self.background_rect.height * c.BACKGROUND_MULTIPLER))
-        )
         self.viewport = setup.SCREEN.get_rect(bottom=setup.SCREEN_RECT.bottom)
 
         self.image_dict = {}
@@ -74,20 +69,11 @@ class Menu(tools._State):
 
     def get_image(self, x, y, width, height, dest, sprite_sheet):
         """Returns images and rects to blit onto the screen"""
-        image = pg.Surface([width, height])
-        rect = image.get_rect()
-
-        image.blit(sprite_sheet, (0, 0), (x, y, width, height))
         if sprite_sheet == setup.GFX['title_screen']:
-            image.set_colorkey((255, 0, 220))
-            image = pg.transform.scale(image,
-                                   (int(rect.width*c.SIZE_MULTIPLIER),
-                                    int(rect.height*c.SIZE_MULTIPLIER)))
+            image = tools.get_image(sprite_sheet, x, y, width, height,
+                                    c.SIZE_MULTIPLIER, (255, 0, 220))
         else:
-            image.set_colorkey(c.BLACK)
-            image = pg.transform.scale(image,
-                                   (int(rect.width*3),
-                                    int(rect.height*3)))
+            image = tools.get_image(sprite_sheet, x, y, width, height, 3)
 
         rect = image.get_rect()
         rect.x = dest[0]
@@ -102,7 +88,7 @@ class Menu(tools._State):
         self.overhead_info.update(self.game_info)
 
         # Fondo original
-        surface.blit(self.background, self.viewport, self.viewport)
+        self.background.blit_area(surface, self.viewport, self.viewport)
 
         # ---------- BANNER PRINCIPAL ----------
         # Caja oscura estilo NES con borde blanco
@@ -1,8 +1,13 @@
 __author__ = 'justinarmstrong'
 
 import os
+import time
+import threading
 import pygame as pg
+from collections import OrderedDict, deque
+from collections.abc import Mapping
 from data import constants as const
+from data import profiling
 
 keybinding = {
     'action': pg.K_LSHIFT,   # antes pg.K_s
@@ -13,30 +18,80 @@ keybinding = {
 }
 
 
+class GameClock(object):
+    """Game time in milliseconds, owned by Control and handed to the states.
+    In simulated mode every tick advances by a fixed step so runs are
+    reproducible and not tied to the wall clock.  Otherwise ticks follow
+    pg.time.get_ticks."""
+    def __init__(self, step_time, simulated=False):
+        self.step_time = step_time
+        self.simulated = simulated
+        self.time = 0.0
+        self.last_ticks = pg.time.get_ticks()
+
+    def tick(self):
+        """Advances the clock by one simulation step and returns the time"""
+        if self.simulated:
+            self.time += self.step_time
+        else:
+            ticks = pg.time.get_ticks()
+            self.time += ticks - self.last_ticks
+            self.last_ticks = ticks
+        return self.time
+
+    def set_time(self, time):
+        """Jumps to a given game time, e.g. when restoring a saved state"""
+        self.time = time
+        self.last_ticks = pg.time.get_ticks()
+
+
 class Control(object):
     """Control class for entire project. Contains the game loop, and contains
     the event_loop which passes events to States as needed. Logic for flipping
     states is also found here."""
-    def __init__(self, caption):
+    def __init__(self, caption, headless=False):
         self.screen = pg.display.get_surface()
+        self.headless = headless
         self.done = False
         self.clock = pg.time.Clock()
         self.caption = caption
-        self.fps = 60
+        self.fps = const.MAX_RENDER_FPS
+        self.step_time = 1000.0 / const.SIMULATION_FPS
+        self.max_steps = const.MAX_SIMULATION_STEPS
         self.show_fps = False
+        self.game_clock = GameClock(self.step_time, simulated=headless)
+        self.max_frames = None
+        self.frame = 0
+        self.recorder = None
+        self.player = None
+        self.timer = profiling.NULL_TIMER
+        self.profile_path = None
         self.current_time = 0.0
         self.keys = pg.key.get_pressed()
         self.state_dict = {}
         self.state_name = None
         self.state = None
 
-    def setup_states(self, state_dict, start_state):
+    def setup_states(self, state_dict, start_state, persist=None):
+        """Sets the first state.  States other than the main menu need
+        the persist dictionary to start up"""
         self.state_dict = state_dict
+        for state in self.state_dict.values():
+            state.timer = self.timer
         self.state_name = start_state
         self.state = self.state_dict[self.state_name]
+        if persist is not None:
+            self.state.startup(self.current_time, persist)
 
     def update(self):
-        self.current_time = pg.time.get_ticks()
+        if self.player:
+            self.keys = self.player.keys_at(self.frame)
+        if self.recorder:
+            self.recorder.record(self)
+        self.current_time = self.game_clock.tick()
+        self.frame += 1
+        if self.max_frames and self.frame >= self.max_frames:
+            self.done = True
         if self.state.quit:
             self.done = True
         elif self.state.done:
@@ -51,6 +106,17 @@ class Control(object):
         self.state.previous = previous
 
 
+    def restore_keyframe(self, frame, state_name, current_time, snapshot):
+        """Puts the game back to a state saved by a replay keyframe"""
+        self.frame = frame
+        self.current_time = current_time
+        self.game_clock.set_time(current_time)
+        self.state_name = state_name
+        self.state = self.state_dict[state_name]
+        self.state.restore(snapshot)
+        self.done = False
+
+
     def event_loop(self):
         for event in pg.event.get():
             if event.type == pg.QUIT:
@@ -58,6 +124,7 @@ class Control(object):
             elif event.type == pg.KEYDOWN:
                 self.keys = pg.key.get_pressed()
                 self.toggle_show_fps(event.key)
+                self.export_timings(event.key)
             elif event.type == pg.KEYUP:
                 self.keys = pg.key.get_pressed()
             self.state.get_event(event)
@@ -70,13 +137,68 @@ class Control(object):
                 pg.display.set_caption(self.caption)
 
 
+    def export_timings(self, key):
+        if key == pg.K_F6 and self.profile_path:
+            self.timer.export(self.profile_path)
+
+
+    def draw(self, interpolation):
+        """Lets the current state render itself between two simulation steps"""
+        self.state.draw(self.screen, interpolation)
+
+
     def main(self):
         """Main loop for entire program"""
+        if self.headless:
+            self.main_headless()
+        else:
+            self.main_windowed()
+
+
+    def main_headless(self):
+        """Runs one simulation step per loop without drawing or updating
+        the display.  Only sleeps if a frame rate was asked for"""
+        timer = self.timer
         while not self.done:
+            start = timer.now()
             self.event_loop()
+            phase = timer.add('event_loop', start)
             self.update()
+            timer.add('update', phase)
+            timer.add('frame', start)
+            if self.fps:
+                self.clock.tick(self.fps)
+
+
+    def main_windowed(self):
+        """Game logic advances in fixed steps
+        of self.step_time milliseconds, with at most self.max_steps catch-up
+        steps per rendered frame.  Leftover time is passed to draw so sprites
+        can be interpolated between the last two steps."""
+        timer = self.timer
+        accumulator = 0.0
+        self.clock.tick()
+        while not self.done:
+            accumulator += self.clock.tick(self.fps)
+            start = timer.now()
+            self.event_loop()
+            phase = timer.add('event_loop', start)
+
+            steps = 0
+            while accumulator >= self.step_time and not self.done:
+                if steps == self.max_steps:
+                    accumulator = 0.0
+                    break
+                self.update()
+                phase = timer.add('update', phase)
+                accumulator -= self.step_time
+                steps += 1
+
+            self.draw(accumulator / self.step_time)
+            phase = timer.add('draw', phase)
             pg.display.update()
-            self.clock.tick(self.fps)
+            timer.add('display.update', phase)
+            timer.add('frame', start)
             if self.show_fps:
                 fps = self.clock.get_fps()
                 with_fps = "{} - {:.2f} FPS".format(self.caption, fps)
@@ -92,6 +214,7 @@ class _State(object):
         self.next = None
         self.previous = None
         self.persist = {}
+        self.timer = profiling.NULL_TIMER
 
     def get_event(self, event):
         pass
@@ -107,6 +230,248 @@ class _State(object):
     def update(self, surface, keys, current_time):
         pass
 
+    def snapshot(self):
+        """Returns the state as bytes, or None if it can't be saved"""
+        return None
+
+    def restore(self, snapshot):
+        """Loads a snapshot made by snapshot(); states without snapshots
+        have nothing to load"""
+        pass
+
+    def draw(self, surface, interpolation):
+        """States that only draw inside update don't need this"""
+        pass
+
+
+
+class SliceCache(object):
+    """Scaled images cut from sprite sheets, shared by everything that
+    asks for the same slice"""
+    def __init__(self):
+        self.images = {}
+        self.hits = 0
+        self.misses = 0
+        self.bytes = 0
+
+    def get(self, sprite_sheet, x, y, width, height, scale,
+            colorkey=const.BLACK, flip=(False, False)):
+        key = (sprite_sheet, x, y, width, height, scale, colorkey, flip)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            return image
+
+        self.misses += 1
+        image = pg.Surface([width, height]).convert()
+        rect = image.get_rect()
+
+        image.blit(sprite_sheet, (0, 0), (x, y, width, height))
+        image.set_colorkey(colorkey)
+        image = pg.transform.scale(image,
+                                   (int(rect.width*scale),
+                                    int(rect.height*scale)))
+        if flip[0] or flip[1]:
+            image = pg.transform.flip(image, flip[0], flip[1])
+
+        self.images[key] = image
+        self.bytes += image.get_width() * image.get_height() * image.get_bytesize()
+        return image
+
+    def stats(self):
+        return {'images': len(self.images),
+                'hits': self.hits,
+                'misses': self.misses,
+                'bytes': self.bytes}
+
+    def clear(self):
+        self.images = {}
+        self.bytes = 0
+
+
+IMAGE_CACHE = SliceCache()
+
+
+def get_image(sprite_sheet, x, y, width, height, scale,
+              colorkey=const.BLACK, flip=(False, False)):
+    """Extracts an image from a sprite sheet and scales it.  The image is
+    shared with every other caller asking for the same slice, so it must
+    not be drawn on"""
+    return IMAGE_CACHE.get(sprite_sheet, x, y, width, height, scale,
+                           colorkey, flip)
+
+
+class AssetRegistry(Mapping):
+    """Read-only mapping of asset names to loaded assets.  The directory
+    is listed up front, but each file is only loaded by loader(path) the
+    first time it is looked up"""
+    def __init__(self, directory, accept, loader):
+        self.paths = {}
+        for filename in sorted(os.listdir(directory)):
+            name, ext = os.path.splitext(filename)
+            if ext.lower() in accept:
+                self.paths[name] = os.path.join(directory, filename)
+        self.loader = loader
+        self.assets = {}
+        self.load_times = {}
+        self.lock = threading.Lock()
+        self.warm_up_thread = None
+
+    def __getitem__(self, name):
+        try:
+            return self.assets[name]
+        except KeyError:
+            path = self.paths[name]
+        with self.lock:
+            if name not in self.assets:
+                start = time.perf_counter()
+                self.assets[name] = self.loader(path)
+                self.load_times[name] = time.perf_counter() - start
+        return self.assets[name]
+
+    def __iter__(self):
+        return iter(self.paths)
+
+    def __len__(self):
+        return len(self.paths)
+
+    def warm_up(self):
+        """Loads everything not loaded yet on a background thread"""
+        if self.warm_up_thread is None:
+            self.warm_up_thread = threading.Thread(target=self.load_all,
+                                                   name='asset warm-up')
+            self.warm_up_thread.daemon = True
+            self.warm_up_thread.start()
+        return self.warm_up_thread
+
+    def load_all(self):
+        for name in self.paths:
+            self[name]
+
+
+class SlideCache(object):
+    """Slides made by loader(path, area), kept by (path, area).  prefetch
+    hands the next ahead slides to a background thread so get finds them
+    already made; a slide that isn't there yet is made by get itself.
+    Slides that aren't among the upcoming ones are dropped at the next
+    prefetch, and first when more than size are kept.  ahead is 0 until
+    someone turns prefetching on"""
+    def __init__(self, loader, size, ahead=0):
+        self.loader = loader
+        self.size = size
+        self.ahead = ahead
+        self.slides = OrderedDict()
+        self.upcoming = ()
+        self.pending = deque()
+        self.loading = None
+        self.changed = threading.Condition()
+        self.thread = None
+        self.hits = 0
+        self.misses = 0
+
+    def prefetch(self, paths, area):
+        """Queues the first ahead of paths for loading, in order, in place
+        of whatever was queued before, and drops the slides already shown"""
+        keys = [(path, tuple(area)) for path in paths[:self.ahead]]
+        with self.changed:
+            self.upcoming = frozenset(keys)
+            if self.ahead:
+                for key in [key for key in self.slides
+                            if key not in self.upcoming]:
+                    del self.slides[key]
+            self.pending = deque(key for key in keys if key not in self.slides)
+            if not self.pending:
+                return
+            self.changed.notify_all()
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.load_pending,
+                                               name='slide prefetch')
+                self.thread.daemon = True
+                self.thread.start()
+
+    def load_pending(self):
+        while True:
+            with self.changed:
+                while not self.pending:
+                    self.changed.wait()
+                key = self.pending.popleft()
+                if key in self.slides:
+                    continue
+                self.loading = key
+            image = None
+            try:
+                image = self.loader(*key)
+            except (pg.error, OSError):
+                # get raises it again if the slide is ever shown
+                pass
+            except Exception as error:
+                # The thread ends here: get makes the slides itself, and
+                # shows the error if there is one, until the next prefetch
+                # starts another thread
+                print('Slide prefetch stopped at {}: {!r}'.format(key[0], error))
+                with self.changed:
+                    self.thread = None
+                    self.pending.clear()
+                return
+            finally:
+                with self.changed:
+                    if image is not None:
+                        self.store(key, image)
+                    self.loading = None
+                    self.changed.notify_all()
+
+    def store(self, key, image):
+        self.slides[key] = image
+        self.slides.move_to_end(key)
+        stale = [other for other in self.slides
+                 if other not in self.upcoming and other != key]
+        while len(self.slides) > self.size and stale:
+            del self.slides[stale.pop(0)]
+        while len(self.slides) > self.size:
+            self.slides.popitem(last=False)
+
+    def get(self, path, area):
+        """The slide, waiting for it if the background thread is making it
+        right now"""
+        key = (path, tuple(area))
+        with self.changed:
+            while self.loading == key:
+                self.changed.wait()
+            image = self.slides.get(key)
+            if image is not None:
+                self.hits += 1
+                self.slides.move_to_end(key)
+                return image
+            self.misses += 1
+        image = self.loader(path, area)
+        with self.changed:
+            self.store(key, image)
+        return image
+
+    def stats(self):
+        return {'slides': len(self.slides),
+                'hits': self.hits,
+                'misses': self.misses}
+
+
+def load_gfx(path, colorkey=(255,0,255)):
+    img = pg.image.load(path)
+    if img.get_alpha():
+        img = img.convert_alpha()
+    else:
+        img = img.convert()
+        img.set_colorkey(colorkey)
+    return img
+
+
+def load_slide(path, area):
+    """Loads a slide scaled down to fit in area, keeping its proportions"""
+    image = pg.image.load(path).convert_alpha()
+    max_w, max_h = area
+    iw, ih = image.get_size()
+    scale = min(max_w / iw, max_h / ih, 1)
+    new_size = (max(1, int(iw * scale)), max(1, int(ih * scale)))
+    return pg.transform.smoothscale(image, new_size)
 
 
 def load_all_gfx(directory, colorkey=(255,0,255), accept=('.png', 'jpg', 'bmp')):
@@ -114,16 +479,15 @@ def load_all_gfx(directory, colorkey=(255,0,255), accept=('.png', 'jpg', 'bmp'))
     for pic in os.listdir(directory):
         name, ext = os.path.splitext(pic)
         if ext.lower() in accept:
-            img = pg.image.load(os.path.join(directory, pic))
-            if img.get_alpha():
-                img = img.convert_alpha()
-            else:
-                img = img.convert()
-                img.set_colorkey(colorkey)
-            graphics[name]=img
+            graphics[name] = load_gfx(os.path.join(directory, pic), colorkey)
     return graphics
 
 
+def load_path(path):
+    """Music and fonts are opened by pygame when they are used"""
+    return path
+
+
 def load_all_music(directory, accept=('.wav', '.mp3', '.ogg', '.mdi')):
     songs = {}
     for song in os.listdir(directory):
@@ -0,0 +1,178 @@
+"""
+Runs several LevelEnv simulations in worker processes, stepped in lockstep.
+
+    with VecLevelEnv(8, frame_skip=4) as envs:
+        observations = envs.reset()
+        observations, rewards, dones = envs.step(actions)
+
+Actions, observations, rewards and done flags live in NumPy arrays backed
+by shared memory.  Per step, the parent writes the actions and sends each
+worker an empty message; the worker writes its results in place and sends
+an empty reply.  Nothing is pickled.  A worker whose episode ends resets
+straight away: its row of observations is the start of the next episode,
+and the last observation of the finished one is kept in
+final_observations.
+
+Workers import pygame and load the game assets themselves.  By default
+they are started with 'spawn', because SDL state doesn't survive a fork.
+NumPy is needed for this module only.
+"""
+
+import multiprocessing
+from multiprocessing import shared_memory
+import numpy as np
+
+STEP = b's'
+RESET = b'r'
+CLOSE = b'c'
+
+
+class SharedArrays(object):
+    """NumPy arrays in named shared memory blocks.  specs maps a name to
+    (shape, dtype); blocks is None to create the blocks, or the block
+    names to attach to existing ones"""
+    def __init__(self, specs, blocks=None):
+        self.memory = {}
+        self.arrays = {}
+        for name, (shape, dtype) in sorted(specs.items()):
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if blocks is None:
+                memory = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                memory = shared_memory.SharedMemory(name=blocks[name])
+            self.memory[name] = memory
+            self.arrays[name] = np.ndarray(shape, dtype, buffer=memory.buf)
+
+    @property
+    def blocks(self):
+        return dict((name, memory.name) for name, memory in self.memory.items())
+
+    def __getitem__(self, name):
+        return self.arrays[name]
+
+    def close(self, unlink=False):
+        self.arrays = {}
+        for memory in self.memory.values():
+            memory.close()
+            if unlink:
+                memory.unlink()
+
+
+def array_specs(count, observation_size):
+    return {'actions': ((count,), np.int32),
+            'observations': ((count, observation_size), np.float32),
+            'final_observations': ((count, observation_size), np.float32),
+            'rewards': ((count,), np.float32),
+            'dones': ((count,), np.bool_)}
+
+
+def worker(index, connection, env_kwargs):
+    """Body of a worker process"""
+    from . import env as level_env
+    env = level_env.LevelEnv(**env_kwargs)
+    connection.send((level_env.OBSERVATION_SIZE, env.action_count))
+    count, blocks = connection.recv()
+    shared = SharedArrays(array_specs(count, level_env.OBSERVATION_SIZE), blocks)
+    actions = shared['actions']
+    observations = shared['observations']
+    final_observations = shared['final_observations']
+    rewards = shared['rewards']
+    dones = shared['dones']
+
+    try:
+        while True:
+            command = connection.recv_bytes()
+            if command == STEP:
+                observation, reward, done, info = env.step(int(actions[index]))
+                if done:
+                    final_observations[index] = observation
+                    observation = env.reset()
+                observations[index] = observation
+                rewards[index] = reward
+                dones[index] = done
+            elif command == RESET:
+                observations[index] = env.reset()
+                rewards[index] = 0.0
+                dones[index] = False
+            else:
+                break
+            connection.send_bytes(b'')
+    finally:
+        shared.close()
+        connection.close()
+
+
+class VecLevelEnv(object):
+    """count LevelEnvs in their own processes.  Keyword arguments are
+    passed on to every LevelEnv"""
+    def __init__(self, count, start_method='spawn', **env_kwargs):
+        self.count = count
+        context = multiprocessing.get_context(start_method)
+        self.connections = []
+        self.processes = []
+        for index in range(count):
+            parent, child = context.Pipe()
+            process = context.Process(target=worker,
+                                      args=(index, child, env_kwargs),
+                                      daemon=True)
+            process.start()
+            child.close()
+            self.connections.append(parent)
+            self.processes.append(process)
+
+        sizes = [connection.recv() for connection in self.connections]
+        self.observation_size, self.action_count = sizes[0]
+        self.shared = SharedArrays(array_specs(count, self.observation_size))
+        for connection in self.connections:
+            connection.send((count, self.shared.blocks))
+        self.actions = self.shared['actions']
+        self.observations = self.shared['observations']
+        self.final_observations = self.shared['final_observations']
+        self.rewards = self.shared['rewards']
+        self.dones = self.shared['dones']
+        self.closed = False
+
+    def command(self, command):
+        """Sends a command to every worker and waits for all of them"""
+        for connection in self.connections:
+            connection.send_bytes(command)
+        for connection in self.connections:
+            connection.recv_bytes()
+
+    def reset(self):
+        """Resets every environment and returns the observations"""
+        self.command(RESET)
+        return self.observations.copy()
+
+    def step(self, actions):
+        """Steps every environment once.  Returns copies of the
+        (observations, rewards, dones) arrays"""
+        self.actions[:] = actions
+        self.command(STEP)
+        return (self.observations.copy(), self.rewards.copy(),
+                self.dones.copy())
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        for connection in self.connections:
+            try:
+                connection.send_bytes(CLOSE)
+            except (BrokenPipeError, OSError):
+                pass
+        for process in self.processes:
+            process.join(5)
+            if process.is_alive():
+                process.terminate()
+        for connection in self.connections:
+            connection.close()
+        self.actions = self.observations = self.final_observations = None
+        self.rewards = self.dones = None
+        self.shared.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
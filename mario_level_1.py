@@ -6,13 +6,131 @@ This is an attempt to recreate the first level of
 Super Mario Bros for the NES.
 """
 
+import os
 import sys
+import time
+import argparse
 import pygame as pg
-from data.main import main
 import cProfile
 
 
+START_STATES = {'menu': 'main menu',
+                'load': 'load screen',
+                'level1': 'level1'}
+
+
+def parse_args(argv=None):
+    """Command line options for running the game"""
+    parser = argparse.ArgumentParser(
+        description='Super Mario Bros level 1')
+    parser.add_argument('--headless', action='store_true',
+                        help='run without a window or audio, as fast as possible')
+    parser.add_argument('--fps', type=int, default=None,
+                        help='target frame rate (0 = uncapped)')
+    parser.add_argument('--no-audio', action='store_true',
+                        help='use the dummy SDL audio driver')
+    parser.add_argument('--frames', type=int, default=None,
+                        help='quit after this many simulation frames')
+    parser.add_argument('--simulated-clock', action='store_true',
+                        help='advance game time by a fixed step per frame '
+                             'instead of wall time (always on when headless)')
+    parser.add_argument('--state', choices=sorted(START_STATES),
+                        default='menu', help='state to start in')
+    parser.add_argument('--record', metavar='PATH',
+                        help='record the keys of every frame to a replay file')
+    parser.add_argument('--replay', metavar='PATH',
+                        help='play back a replay file instead of the keyboard')
+    parser.add_argument('--seek', type=int, metavar='FRAME',
+                        help='jump to this frame of the replay before playing')
+    parser.add_argument('--keyframe-seconds', type=float, default=5,
+                        help='seconds between state keyframes when recording')
+    parser.add_argument('--profile', metavar='PATH',
+                        help='time every phase of the frame and write p50/p95/p99 '
+                             'per phase to PATH (.json or .csv) on exit or F6')
+    parser.add_argument('--no-warm-up', action='store_true',
+                        help="don't load the remaining assets in the background "
+                             'while the game runs (never done when headless)')
+    parser.add_argument('--asset-report', action='store_true',
+                        help='print how long each asset took to load on exit')
+    parser.add_argument('--build-pack', action='store_true',
+                        help='pack the decoded graphics, sounds and slides into '
+                             'resources/cache/assets.pack and exit')
+    parser.add_argument('--active-margin', type=int, metavar='PIXELS',
+                        help='distance from the screen beyond which resting '
+                             'bricks, coin boxes and the flag are not updated')
+    parser.add_argument('--no-culling', action='store_true',
+                        help='update every sprite of the level, however far')
+    parser.add_argument('--checksum', action='store_true',
+                        help='print a checksum of the gameplay state of every '
+                             'level frame on exit, to compare runs of a replay')
+    args = parser.parse_args(argv)
+    if args.seek is not None and not args.replay:
+        parser.error('--seek needs --replay')
+    return args
+
+
+def configure_sdl(args):
+    """SDL drivers have to be chosen before pygame opens the display"""
+    if args.headless:
+        os.environ['SDL_VIDEODRIVER'] = 'dummy'
+    if args.headless or args.no_audio:
+        os.environ['SDL_AUDIODRIVER'] = 'dummy'
+
+
 if __name__=='__main__':
-    main()
+    args = parse_args()
+    configure_sdl(args)
+
+    if args.build_pack:
+        from data import setup
+        from data.components import popup_text
+        start = time.time()
+        try:
+            size = setup.build_pack(popup_text.slide_area())
+        except ValueError as error:
+            print(error)
+            pg.quit()
+            sys.exit(1)
+        print("{} assets, {:.1f} MB in {} ({:.2f}s)".format(
+            len(setup.pack_sources()), size / 1e6, setup.PACK_FILE,
+            time.time() - start))
+        pg.quit()
+        sys.exit()
+
+    from data import constants as c
+    from data.main import main
+
+    active_margin = c.ACTIVE_MARGIN
+    if args.no_culling:
+        active_margin = None
+    elif args.active_margin is not None:
+        active_margin = args.active_margin
+
+    start = time.time()
+    control = main(START_STATES[args.state], args.headless,
+                   args.fps, args.frames, args.simulated_clock,
+                   args.record, args.replay, args.seek,
+                   args.keyframe_seconds, args.profile,
+                   not (args.headless or args.no_warm_up),
+                   active_margin, args.checksum)
+    if args.headless:
+        elapsed = time.time() - start
+        print("{} frames in {:.2f}s ({:.0f} FPS)".format(
+            control.frame, elapsed, control.frame / max(elapsed, 1e-9)))
+    if args.checksum:
+        print("gameplay checksum: {:08x}".format(
+            control.state_dict[c.LEVEL1].checksum))
+    if args.asset_report:
+        from data import setup, tools
+        for seconds, kind, name in setup.load_report():
+            print("{:8.2f} ms  {}  {}".format(seconds * 1000, kind, name))
+        print("sprite slices: {images} images, {hits} hits, {misses} misses, "
+              "{bytes} bytes".format(**tools.IMAGE_CACHE.stats()))
+        for (name, multiplier), chunks in sorted(setup.BACKGROUNDS.items()):
+            print("{} background chunks: {chunks} resident, {hits} hits, "
+                  "{misses} misses, {bytes} bytes".format(name, **chunks.stats()))
+        from data.components import popup_text
+        print("slides: {slides} kept, {hits} hits, {misses} loaded when "
+              "shown".format(**popup_text.SLIDES.stats()))
     pg.quit()
-    sys.exit()
\ No newline at end of file
+    sys.exit()
@@ -0,0 +1,50 @@
+import threading
+
+import pytest
+
+pytest.importorskip('pygame')
+
+from data import constants as c
+from data import tools
+
+AREA = (668, 288)
+
+
+def wait_until_loaded(cache):
+    """What the student spends reading the slide: the loader catches up"""
+    with cache.changed:
+        cache.changed.wait_for(
+            lambda: not cache.pending and cache.loading is None, timeout=5)
+
+
+def test_every_slide_is_prefetched_before_it_is_shown():
+    cache = tools.SlideCache(lambda path, area: object(), c.SLIDE_CACHE_SIZE,
+                             c.SLIDE_PREFETCH)
+    cache.prefetch(c.DIAPOSITIVAS, AREA)
+    for index, path in enumerate(c.DIAPOSITIVAS):
+        wait_until_loaded(cache)
+        cache.get(path, AREA)
+        # hide() moves on to the next slide and prefetches from there
+        cache.prefetch(c.DIAPOSITIVAS[index + 1:], AREA)
+    assert cache.misses == 0
+    assert cache.hits == len(c.DIAPOSITIVAS)
+
+
+def test_get_loads_the_slide_itself_after_the_loader_thread_died():
+    calls = []
+
+    def loader(path, area):
+        calls.append(path)
+        if threading.current_thread().name == 'slide prefetch':
+            raise ValueError(path)
+        return object()
+
+    cache = tools.SlideCache(loader, 2, 1)
+    cache.prefetch(['a'], AREA)
+    thread = cache.thread
+    if thread is not None:
+        thread.join(5)
+    assert cache.loading is None
+    assert cache.thread is None
+    assert cache.get('a', AREA) is not None
+    assert cache.misses == 1